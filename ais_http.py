@@ -0,0 +1,135 @@
+# ais_http.py
+# AIS 站点的 HTTP 工具：长连接 Session、从浏览器导出 cookie、解析页面表单字段
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = 10
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+)
+APPOINTMENT_FORM_FIELDS = [
+    "utf8",
+    "authenticity_token",
+    "confirmed_limit_message",
+    "use_consulate_appointment_capacity",
+]
+
+
+class SessionExpired(Exception):
+    pass
+
+
+def new_session(user_agent=None, cookies=None):
+    # keep-alive 连接池，避免每次轮询重新握手 TLS
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if user_agent:
+        session.headers["User-Agent"] = user_agent
+    load_cookies(session, cookies or [])
+    return session
+
+
+def cookie_jar(cookies):
+    # cookies 为 selenium get_cookies() 的格式: [{'name', 'value', 'domain', 'path'}, ...]
+    jar = requests.cookies.RequestsCookieJar()
+    for c in cookies:
+        jar.set(c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'))
+    return jar
+
+
+def load_cookies(session, cookies):
+    session.cookies.update(cookie_jar(cookies))
+
+
+def export_driver_session(driver, session=None):
+    # 只在登录后调用一次：把 Chrome 的 cookie 和 UA 交给 requests.Session
+    user_agent = driver.execute_script("return navigator.userAgent;")
+    if session is None:
+        return new_session(user_agent, driver.get_cookies())
+    session.headers["User-Agent"] = user_agent
+    sync_cookies(session, driver)
+    return session
+
+
+def sync_cookies(session, driver):
+    # 先从 Chrome 取 cookie（一次 WebDriver 往返），再整体替换 jar：
+    # 共用这个 session 的后台线程（预约表单刷新）不会在中间拿到一个空的 jar
+    session.cookies = cookie_jar(driver.get_cookies())
+
+
+class _InputParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.fields = {}
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in ("input", "meta"):
+            return
+        attrs = dict(attrs)
+        if tag == "meta":
+            # Rails 在 <meta name="csrf-token"> 中也会放一份 token
+            if attrs.get("name") == "csrf-token":
+                self.fields.setdefault("authenticity_token", attrs.get("content") or "")
+            return
+        name = attrs.get("name")
+        if name:
+            self.fields[name] = attrs.get("value") or ""
+
+
+def extract_form_fields(html, names=None):
+    parser = _InputParser()
+    parser.feed(html)
+    if names is None:
+        return parser.fields
+    missing = [n for n in names if n not in parser.fields]
+    if missing:
+        raise ValueError(f"页面缺少表单字段: {missing}")
+    return {n: parser.fields[n] for n in names}
+
+
+def is_session_expired(response):
+    return response.status_code == 401 or "session expired" in response.text.lower()
+
+
+def ajax_headers(referer):
+    return {
+        "Referer": referer,
+        "X-Requested-With": "XMLHttpRequest",
+    }
+
+
+def fetch_json(session, url, referer, timeout=30):
+    response = session.get(url, headers=ajax_headers(referer), timeout=timeout)
+    if is_session_expired(response):
+        raise SessionExpired(f"session expired ({response.status_code}): {url}")
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_appointment_form(session, appointment_url, timeout=30):
+    response = session.get(appointment_url, timeout=timeout)
+    if is_session_expired(response):
+        raise SessionExpired(f"session expired ({response.status_code}): {appointment_url}")
+    response.raise_for_status()
+    return extract_form_fields(response.text, APPOINTMENT_FORM_FIELDS)
+
+
+def book_appointment(session, appointment_url, form_fields, facility_id, date, time_str, timeout=30):
+    data = dict(form_fields)
+    data.update({
+        "appointments[consulate_appointment][facility_id]": facility_id,
+        "appointments[consulate_appointment][date]": date,
+        "appointments[consulate_appointment][time]": time_str,
+    })
+    response = session.post(appointment_url, headers={"Referer": appointment_url}, data=data, timeout=timeout)
+    if is_session_expired(response):
+        raise SessionExpired(f"session expired ({response.status_code}): {appointment_url}")
+    # 限流和服务器错误交给调用方重试；其他情况按页面内容判断是否成功
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    return "Successfully Scheduled" in response.text
@@ -0,0 +1,283 @@
+# benchmark.py
+# 离线性能基准：在本地 AIS 替身服务器（mock_ais.py）上测量
+#   visa_*     visa.py 单账号轮询器：fetch_facilities 吞吐，以及 变化检测 -> 规则过滤 -> 并发 times + 预取表单 -> 提交
+#              的检测到预约延迟（与生产单账号运行相同的代码路径）
+#   polls      multi.py 申请人的轮询吞吐（次/秒）和 days 请求延迟分位数
+#   book       multi.py 申请人从放出日期到预约 POST 成功的延迟（服务器端计时）
+#   memory     每个账号（会话 + 轮询状态）的内存占用
+#
+# 基准使用临时生成的配置文件（BASE_URL 指向替身服务器，可选功能全部关闭），不读取也不写入 config.ini 对应的
+# 历史库、会话缓存等文件；visa / multi 在配置文件写好之后才导入
+#
+# 运行: python benchmark.py [--target all|visa|multi] [--seconds 5] [--accounts 20] [--json result.json] [--baseline old.json]
+# 指定 --baseline 时，与之前保存的结果比较，任一指标退化超过 --tolerance 即以非零状态退出
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_ais import Scenario, start_server
+
+FACILITY_ID = "95"
+MY_SCHEDULE_DATE = "2027-01-01"
+LATE_DATE = "2027-03-01"
+EARLY_DATE = "2026-12-01"
+
+# 越大越好的指标；其余都是越小越好
+HIGHER_IS_BETTER = {"polls_per_sec", "visa_polls_per_sec"}
+
+BENCH_CONFIG = """\
+[USVISA]
+USERNAME = bench@example.com
+PASSWORD = secret
+SCHEDULE_ID = 1000
+MY_SCHEDULE_DATE = {my_date}
+COUNTRY_CODE = en-ca
+FACILITY_ID = {facility}
+BASE_URL = {base_url}
+LOGIN_BACKEND = http
+
+[SENDGRID]
+SENDGRID_API_KEY =
+
+[PUSHOVER]
+PUSH_TOKEN =
+PUSH_USER =
+"""
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def write_config(base_url):
+    # visa 导入时读取 VISA_CONFIG；必须在导入 visa / multi 之前调用
+    path = os.path.join(tempfile.mkdtemp(prefix="visa-bench-"), "config.ini")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(BENCH_CONFIG.format(my_date=MY_SCHEDULE_DATE, facility=FACILITY_ID, base_url=base_url))
+    os.environ["VISA_CONFIG"] = path
+    return path
+
+
+def use_scenario(server, scenario):
+    # visa 的 URL 在导入时就固定了，所有 visa 试验共用一个服务器，只替换场景
+    server.RequestHandlerClass.scenario = scenario
+
+
+def bench_visa_polls(server, seconds):
+    import visa
+    use_scenario(server, Scenario({FACILITY_ID: {LATE_DATE: ["08:00"]}}))
+    visa.login()
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        visa.fetch_facilities(visa.FACILITY_IDS)
+        latencies.append(time.monotonic() - started)
+    return {
+        "visa_polls_per_sec": len(latencies) / seconds,
+        "visa_poll_p50_ms": percentile(latencies, 50) * 1000,
+        "visa_poll_p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def bench_visa_book(server, trials, poll_interval):
+    # 与 visa.main 每一轮相同：get_candidates -> 变化事件 -> date_rules.filter -> reschedule
+    import visa
+    # 整个测试共用一个场景和一次登录（与生产中长期运行的轮询器一样，表单在后台预取），每次试验只重置可预约日期
+    scenario = Scenario({FACILITY_ID: {LATE_DATE: ["08:00"]}})
+    use_scenario(server, scenario)
+    visa.login()
+    visa.form_cache.start()
+    latencies = []
+    for _ in range(trials):
+        with scenario.lock:
+            scenario.facilities = {FACILITY_ID: {LATE_DATE: ["08:00"]}}
+            scenario.bookings = []
+        visa.EXIT = False
+        visa.change_detector.reset()
+        released = False
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and not visa.EXIT:
+            candidates = visa.get_candidates()
+            detected_at = time.monotonic()
+            if visa.change_detector.pop_events():
+                acceptable = visa.date_rules.filter(candidates)
+                if acceptable:
+                    visa.reschedule(acceptable, detected_at)
+                    continue
+            if not released:
+                with scenario.lock:
+                    scenario.add_slot(FACILITY_ID, EARLY_DATE, ["09:00"])
+                released = True
+            time.sleep(poll_interval)
+        latencies.extend(b["latency"] for b in scenario.bookings if b["latency"] is not None)
+    visa.form_cache.stop()
+    return {
+        "visa_book_trials_ok": len(latencies),
+        "visa_detect_to_book_p50_ms": percentile(latencies, 50) * 1000,
+        "visa_detect_to_book_max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+def make_applicant(base_url, name="bench"):
+    from multi import Applicant
+    return Applicant(name, {
+        'USERNAME': f"{name}@example.com",
+        'PASSWORD': "secret",
+        'SCHEDULE_ID': "1000",
+        'FACILITY_ID': FACILITY_ID,
+        'MY_SCHEDULE_DATE': MY_SCHEDULE_DATE,
+    }, base_url=base_url)
+
+
+def bench_polls(seconds):
+    scenario = Scenario({FACILITY_ID: {LATE_DATE: ["08:00"]}})
+    server, base_url = start_server(scenario)
+    try:
+        app = make_applicant(base_url)
+        app.login()
+        latencies = []
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            app.get_date()
+            latencies.append(time.monotonic() - started)
+    finally:
+        server.shutdown()
+    return {
+        "polls_per_sec": len(latencies) / seconds,
+        "poll_p50_ms": percentile(latencies, 50) * 1000,
+        "poll_p95_ms": percentile(latencies, 95) * 1000,
+        "poll_p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def bench_book(trials, poll_interval):
+    # 放号后轮询检测到、查 times、取表单、提交；延迟由服务器从放号时刻计到预约成功
+    latencies = []
+    for _ in range(trials):
+        scenario = Scenario({FACILITY_ID: {LATE_DATE: ["08:00"]}})
+        server, base_url = start_server(scenario)
+        try:
+            app = make_applicant(base_url)
+            app.login()
+            released = False
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                acceptable = app.acceptable(app.get_date())
+                if acceptable:
+                    ok, _ = app.reschedule(acceptable[0])
+                    if ok:
+                        break
+                if not released:
+                    with scenario.lock:
+                        scenario.add_slot(FACILITY_ID, EARLY_DATE, ["09:00"])
+                    released = True
+                time.sleep(poll_interval)
+        finally:
+            server.shutdown()
+        latencies.extend(b["latency"] for b in scenario.bookings if b["latency"] is not None)
+    return {
+        "book_trials_ok": len(latencies),
+        "detect_to_book_p50_ms": percentile(latencies, 50) * 1000,
+        "detect_to_book_max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+def bench_memory(accounts):
+    scenario = Scenario({FACILITY_ID: {LATE_DATE: ["08:00"]}})
+    server, base_url = start_server(scenario)
+    try:
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        apps = [make_applicant(base_url, f"acct{i}") for i in range(accounts)]
+        with ThreadPoolExecutor(max_workers=min(accounts, 16)) as pool:
+            list(pool.map(lambda a: a.login(), apps))
+            list(pool.map(lambda a: a.get_date(), apps))
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        server.shutdown()
+    return {
+        "memory_per_account_kb": (after - before) / accounts / 1024,
+        "memory_peak_kb": peak / 1024,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, old in baseline.items():
+        new = results.get(key)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if key in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(f"{key}: {old:.2f} -> {new:.2f} ({worse * 100:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线性能基准（本地 AIS 替身服务器）")
+    parser.add_argument("--target", choices=("all", "visa", "multi"), default="all",
+                        help="visa：visa.py 单账号轮询器；multi：multi.py 申请人")
+    parser.add_argument("--seconds", type=float, default=5.0, help="吞吐测试时长")
+    parser.add_argument("--trials", type=int, default=5, help="检测到预约延迟的试验次数")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="预约试验中的轮询间隔（秒）")
+    parser.add_argument("--accounts", type=int, default=20, help="内存测试的账号数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前的 JSON 结果比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    args = parser.parse_args()
+
+    # 不调用 setup_logging，只输出警告，避免日志 I/O 干扰测量
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # visa 用的替身服务器在导入 visa 之前启动，配置文件里写它的地址
+    server, base_url = start_server(Scenario({FACILITY_ID: {LATE_DATE: ["08:00"]}}))
+    write_config(base_url)
+
+    results = {}
+    try:
+        if args.target in ("all", "visa"):
+            results.update(bench_visa_polls(server, args.seconds))
+            results.update(bench_visa_book(server, args.trials, args.poll_interval))
+        if args.target in ("all", "multi"):
+            results.update(bench_polls(args.seconds))
+            results.update(bench_book(args.trials, args.poll_interval))
+            results.update(bench_memory(args.accounts))
+    finally:
+        server.shutdown()
+
+    for key, value in results.items():
+        print(f"{key:28s} {value:12.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("性能退化:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("与基线相比无明显退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# booking_form.py
+# 预约表单缓存：后台线程定期刷新 appointment 页面的隐藏字段（authenticity_token 等），
+# 发现更早日期时直接用缓存的字段提交，关键路径上只剩 times 查询和最终的 POST
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class FormCache:
+    def __init__(self, fetch, refresh_interval=120, max_age=300):
+        # fetch: 无参函数，返回表单字段 dict
+        self._fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._fields = None
+        self._fetched_at = 0.0
+        # 每次 invalidate 加一，防止旧会话下发出的刷新结果覆盖新会话的缓存
+        self._generation = 0
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        started = time.monotonic()
+        with self._lock:
+            generation = self._generation
+        fields = self._fetch()
+        with self._lock:
+            if generation == self._generation:
+                self._fields = fields
+                self._fetched_at = time.monotonic()
+        logger.info(f"预约表单已刷新，耗时 {(time.monotonic() - started) * 1000:.0f} ms")
+        return dict(fields)
+
+    def get(self):
+        # 缓存新鲜时直接返回；过期或为空时同步拉取一次
+        with self._lock:
+            if self._fields is not None and time.monotonic() - self._fetched_at < self.max_age:
+                return dict(self._fields)
+        logger.info("预约表单缓存不可用，同步获取")
+        return self.refresh()
+
+    def invalidate(self):
+        # 重新登录或提交之后 token 不再可靠，丢弃缓存并让后台线程尽快重新拉取
+        with self._lock:
+            self._fields = None
+            self._fetched_at = 0.0
+            self._generation += 1
+        self._wakeup.set()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="form-cache", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self.refresh_interval
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"后台刷新预约表单失败: {e}")
+                wait = min(self.refresh_interval, 10)
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
@@ -0,0 +1,172 @@
+# browser_pool.py
+# 浏览器生命周期管理：限制同时存活的 Chrome 数量，退出/替换时 quit 并删除临时 profile，
+# 可选保留空闲浏览器复用，以及一个预先启动并登录好的备用浏览器（会话过期时直接换上）
+import os
+import re
+import time
+import shutil
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PREFIX = "chrome-profile-"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_stale_profiles(tmp_dir=None):
+    # 清理之前崩溃的进程留下的 profile 目录（目录名中带有创建进程的 pid）
+    tmp_dir = tmp_dir or tempfile.gettempdir()
+    pattern = re.compile(rf"^{PROFILE_PREFIX}(\d+)-")
+    removed = 0
+    for name in os.listdir(tmp_dir):
+        match = pattern.match(name)
+        if match and not _pid_alive(int(match.group(1))):
+            shutil.rmtree(os.path.join(tmp_dir, name), ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"已清理 {removed} 个遗留的 Chrome profile 目录")
+
+
+class BrowserPool:
+    def __init__(self, factory, max_browsers=2, max_idle=0, standby_login=None, standby_max_age=1200):
+        # factory(profile_dir) -> driver；standby_login(driver) 在备用浏览器上完成登录
+        self.factory = factory
+        self.max_idle = max_idle
+        self.standby_login = standby_login
+        self.standby_max_age = standby_max_age
+        self._slots = threading.BoundedSemaphore(max_browsers)
+        self._lock = threading.Lock()
+        self._profiles = {}       # id(driver) -> profile_dir
+        self._idle = []
+        self._standby = None      # (driver, ready_at)
+        self._standby_thread = None
+        self._retiring = {}       # id(driver) -> (driver, timer)
+        self._closed = False
+
+    def _launch(self, block=True):
+        if not self._slots.acquire(blocking=block):
+            return None
+        profile_dir = tempfile.mkdtemp(prefix=f"{PROFILE_PREFIX}{os.getpid()}-")
+        try:
+            started = time.monotonic()
+            driver = self.factory(profile_dir)
+            logger.info(f"Chrome 已启动，耗时 {time.monotonic() - started:.1f} 秒")
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            self._slots.release()
+            raise
+        with self._lock:
+            self._profiles[id(driver)] = profile_dir
+        return driver
+
+    def acquire(self, block=True):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._launch(block)
+
+    def release(self, driver):
+        # 用完的浏览器清掉 cookie 后留作空闲复用，超过 max_idle 则直接关闭
+        try:
+            driver.delete_all_cookies()
+        except Exception:
+            return self.discard(driver)
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(driver)
+                return
+        self.discard(driver)
+
+    def discard(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"关闭 Chrome 失败: {e}")
+        with self._lock:
+            profile_dir = self._profiles.pop(id(driver), None)
+        if profile_dir:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            self._slots.release()
+
+    def retire(self, driver, grace=30.0):
+        # 被替换下来的浏览器：轮询线程可能刚拿到它还在同步 cookie，过一段时间再关闭
+        timer = threading.Timer(grace, self._retire_now, (driver,))
+        timer.daemon = True
+        with self._lock:
+            self._retiring[id(driver)] = (driver, timer)
+        timer.start()
+
+    def _retire_now(self, driver):
+        with self._lock:
+            entry = self._retiring.pop(id(driver), None)
+        if entry is not None:
+            self.discard(driver)
+            # 保活刷新时旧浏览器还占着名额，备用浏览器没能启动；新浏览器已经换上，空出来的名额留给备用浏览器
+            # （discard 不在这里补：重新登录前关闭旧浏览器时，名额要留给马上要登录的新浏览器）
+            self.prepare_standby()
+
+    def take_standby(self):
+        # 取走已登录的备用浏览器（过旧的丢弃），并在后台准备下一个
+        with self._lock:
+            standby, self._standby = self._standby, None
+        if standby is not None and time.monotonic() - standby[1] > self.standby_max_age:
+            logger.info("备用浏览器会话过旧，丢弃")
+            self.discard(standby[0])
+            standby = None
+        self.prepare_standby()
+        return standby[0] if standby else None
+
+    def prepare_standby(self):
+        if self.standby_login is None or self._closed:
+            return
+        with self._lock:
+            if self._standby is not None or (self._standby_thread and self._standby_thread.is_alive()):
+                return
+            self._standby_thread = threading.Thread(target=self._prepare_standby, name="browser-standby", daemon=True)
+            self._standby_thread.start()
+
+    def _prepare_standby(self):
+        # 没有空闲名额时不抢占，等下次再准备
+        driver = self._launch(block=False)
+        if driver is None:
+            return
+        try:
+            self.standby_login(driver)
+        except Exception as e:
+            logger.warning(f"备用浏览器登录失败: {e}")
+            self.discard(driver)
+            return
+        with self._lock:
+            if not self._closed:
+                self._standby = (driver, time.monotonic())
+                driver = None
+        if driver is not None:
+            self.discard(driver)
+        else:
+            logger.info("备用浏览器已就绪")
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            drivers = list(self._idle)
+            self._idle.clear()
+            if self._standby is not None:
+                drivers.append(self._standby[0])
+                self._standby = None
+            for driver, timer in self._retiring.values():
+                timer.cancel()
+                drivers.append(driver)
+            self._retiring.clear()
+        for driver in drivers:
+            self.discard(driver)
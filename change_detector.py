@@ -0,0 +1,71 @@
+# change_detector.py
+# 可预约日期变化检测：对每个 days 响应做指纹（服务器支持时同时使用 ETag/Last-Modified 条件请求），
+# 内容没变就直接返回上次解析的结果，变化时生成一条只含新增/移除日期的事件
+import hashlib
+import threading
+from collections import namedtuple
+
+ChangeEvent = namedtuple("ChangeEvent", ["key", "added", "removed", "first"])
+
+_Seen = namedtuple("_Seen", ["fingerprint", "dates", "validators"])
+
+
+def fingerprint(content):
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+def _validators(response):
+    validators = {}
+    if response.headers.get("ETag"):
+        validators["If-None-Match"] = response.headers["ETag"]
+    if response.headers.get("Last-Modified"):
+        validators["If-Modified-Since"] = response.headers["Last-Modified"]
+    return validators
+
+
+class ChangeDetector:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._events = []
+
+    def conditional_headers(self, key):
+        with self._lock:
+            seen = self._seen.get(key)
+        return dict(seen.validators) if seen else {}
+
+    def parse(self, key, response):
+        with self._lock:
+            seen = self._seen.get(key)
+        if seen is not None:
+            if response.status_code == 304:
+                return seen.dates
+            digest = fingerprint(response.content)
+            if digest == seen.fingerprint:
+                return seen.dates
+        else:
+            digest = fingerprint(response.content)
+
+        dates = response.json()
+        old = {d.get('date') for d in seen.dates} if seen else set()
+        new = {d.get('date') for d in dates}
+        event = ChangeEvent(key, sorted(new - old), sorted(old - new), seen is None)
+        with self._lock:
+            self._seen[key] = _Seen(digest, dates, _validators(response))
+            self._events.append(event)
+        return dates
+
+    def seed(self, key, dates):
+        # 用检查点里上一个进程看到的日期作为基线：第一次响应不再算作首次，只上报相对基线的变化
+        with self._lock:
+            self._seen[key] = _Seen(None, [{"date": d} for d in dates], {})
+
+    def pop_events(self):
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def reset(self):
+        # 下一次响应无论内容是否变化都会重新评估（例如预约失败后需要重试同一个日期）
+        with self._lock:
+            self._seen.clear()
@@ -0,0 +1,163 @@
+# check_retry.py
+# 熔断器状态机的脚本化检查：在本地 AIS 替身服务器（mock_ais.py）上用真实请求走一遍 retry.Retrier
+#   probe_4xx       探测请求以 4xx 结束：回到 open 重新计时，之后的探测成功即关闭
+#   probe_relogin   探测请求遇到会话过期：重新登录后同一次调用成功，熔断关闭
+#   probe_timeout   探测请求迟迟没有结果：超过 reset_timeout 后放行下一个探测，不会一直停在 half_open
+#   book_no_retry   预约提交读超时：不重试，直接抛给调用方
+#
+# 运行: python check_retry.py，任一检查失败即以非零状态退出
+import sys
+import time
+import logging
+import threading
+
+import requests
+
+from ais_http import fetch_json, book_appointment
+from http_login import http_login
+from mock_ais import Scenario, start_server
+from retry import Retrier, CircuitBreaker, CircuitOpen
+
+COUNTRY_CODE = "en-ca"
+SCHEDULE_ID = "1000"
+FACILITY_ID = "95"
+RESET_TIMEOUT = 0.3
+TIMEOUT = 0.2
+
+
+class Client:
+    # 一个账号：当前会话 + 重试器，会话过期时重新登录
+    def __init__(self, server, base_url):
+        self.server = server
+        self.base_url = base_url
+        self.schedule_url = f"{base_url}/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}"
+        self.session = None
+        self.relogins = 0
+        self.retrier = Retrier(max_attempts=1, base_delay=0, failure_threshold=1, reset_timeout=RESET_TIMEOUT,
+                               on_session_expired=self.login)
+        self.login()
+        self.relogins = 0
+
+    def login(self):
+        self.session = http_login(self.base_url, COUNTRY_CODE, "check@example.com", "secret", session=self.session)
+        self.relogins += 1
+
+    def days(self, timeout=TIMEOUT, path=None):
+        url = f"{self.schedule_url}/appointment/days/{FACILITY_ID}.json" if path is None else self.base_url + path
+        return self.retrier.call("days", lambda: fetch_json(self.session, url, self.schedule_url, timeout=timeout))
+
+    def breaker(self):
+        return self.retrier.breaker("days")
+
+    def open_breaker(self):
+        # 一次读超时（failure_threshold=1）即打开熔断，然后等到允许探测
+        scenario = self.server.RequestHandlerClass.scenario
+        scenario.latency_ms = TIMEOUT * 2000
+        try:
+            self.days()
+        except requests.exceptions.Timeout:
+            pass
+        scenario.latency_ms = 0
+        assert self.breaker().state == CircuitBreaker.OPEN, f"熔断没有打开: {self.breaker().state}"
+        time.sleep(RESET_TIMEOUT + 0.05)
+
+
+def check_probe_4xx(client):
+    client.open_breaker()
+    try:
+        client.days(path="/no-such-page")
+    except requests.exceptions.HTTPError:
+        pass
+    assert client.breaker().state == CircuitBreaker.OPEN, f"4xx 探测后应回到 open: {client.breaker().state}"
+    try:
+        client.days()
+        raise AssertionError("重新计时期间应抛出 CircuitOpen")
+    except CircuitOpen:
+        pass
+    time.sleep(RESET_TIMEOUT + 0.05)
+    client.days()
+    assert client.breaker().state == CircuitBreaker.CLOSED, f"探测成功后应关闭: {client.breaker().state}"
+
+
+def check_probe_relogin(client):
+    client.open_breaker()
+    scenario = client.server.RequestHandlerClass.scenario
+    with scenario.lock:
+        scenario.sessions.clear()
+    client.days()
+    assert client.relogins == 1, f"应重新登录一次: {client.relogins}"
+    assert client.breaker().state == CircuitBreaker.CLOSED, f"重新登录后的探测成功应关闭: {client.breaker().state}"
+
+
+def check_probe_timeout(client):
+    client.open_breaker()
+    # 第一个探测卡住（长超时 + 服务器延迟），超过 reset_timeout 后第二个调用应被放行为新的探测
+    scenario = client.server.RequestHandlerClass.scenario
+    scenario.latency_ms = (RESET_TIMEOUT + 0.4) * 1000
+    stuck = threading.Thread(target=lambda: client.days(timeout=5), daemon=True)
+    stuck.start()
+    time.sleep(0.05)
+    assert client.breaker().state == CircuitBreaker.HALF_OPEN, f"应处于 half_open: {client.breaker().state}"
+    time.sleep(RESET_TIMEOUT + 0.05)
+    try:
+        client.days(timeout=5)
+    except CircuitOpen as e:
+        raise AssertionError(f"探测超时后仍然拒绝: {e}")
+    finally:
+        scenario.latency_ms = 0
+        stuck.join()
+    assert client.breaker().state == CircuitBreaker.CLOSED, f"第二个探测成功后应关闭: {client.breaker().state}"
+
+
+def check_book_no_retry(client):
+    scenario = client.server.RequestHandlerClass.scenario
+    scenario.latency_ms = TIMEOUT * 2000
+    calls = []
+
+    def book():
+        calls.append(1)
+        return book_appointment(client.session, f"{client.schedule_url}/appointment", {},
+                                FACILITY_ID, "2026-12-01", "08:00", timeout=TIMEOUT)
+    retrier = Retrier(max_attempts=4, base_delay=0)
+    try:
+        retrier.call("book", book)
+        raise AssertionError("读超时应抛给调用方")
+    except requests.exceptions.Timeout:
+        pass
+    finally:
+        scenario.latency_ms = 0
+    assert len(calls) == 1, f"预约提交读超时后不应重试: 提交了 {len(calls)} 次"
+
+
+CHECKS = [
+    ("probe_4xx", check_probe_4xx),
+    ("probe_relogin", check_probe_relogin),
+    ("probe_timeout", check_probe_timeout),
+    ("book_no_retry", check_book_no_retry),
+]
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s [%(levelname)s] %(message)s')
+    failed = 0
+    for name, check in CHECKS:
+        # 每个检查一个新的替身服务器和账号，互不影响
+        server, base_url = start_server(Scenario({FACILITY_ID: {"2027-03-01": ["08:00"]}}))
+        # 读超时的客户端先断开，服务器写响应时的 BrokenPipe 不用打印
+        server.handle_error = lambda request, client_address: None
+        try:
+            check(Client(server, base_url))
+            print(f"{name:16s} 通过")
+        except AssertionError as e:
+            failed += 1
+            print(f"{name:16s} 失败: {e}")
+        except Exception as e:
+            failed += 1
+            print(f"{name:16s} 失败: {type(e).__name__}: {e}")
+        finally:
+            server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# cli.py
+# 统一入口：
+#   python cli.py poll                         轮询并自动预约（与 python visa.py 相同）
+#   python cli.py dry-run                      轮询并按策略排好时间段，只记录将会预约什么，不提交
+#   python cli.py book --date 2026-11-02 [--facility 95]   立即尝试预约指定日期
+#   python cli.py login-check                  登录一次并请求各使馆的 days 接口，成功返回 0
+#   python cli.py multi                        多申请人模式（multi.py）
+#   python cli.py supervise                    按 [SUPERVISOR] WORKERS 启动并监管轮询 worker（supervisor.py）
+# 全局参数 --config 指定配置文件；各子命令只在运行时才导入对应模块，Selenium 只在需要浏览器时导入
+import os
+import sys
+import argparse
+
+
+def cmd_poll(args):
+    import visa
+    return visa.main()
+
+
+def cmd_dry_run(args):
+    import visa
+    return visa.main(dry_run=True)
+
+
+def cmd_book(args):
+    import visa
+    visa.setup_logging(visa.config)
+    facility_id = args.facility or visa.FACILITY_ID
+    try:
+        visa.login()
+        visa.reschedule([(args.date, facility_id)])
+    finally:
+        # 通知在后台队列里，退出前必须发出
+        visa.close_services()
+    return 0 if visa.EXIT else 1
+
+
+def cmd_login_check(args):
+    import visa
+    visa.setup_logging(visa.config)
+    try:
+        visa.login()
+        for facility_id in visa.FACILITY_IDS:
+            dates = visa.fetch_dates(facility_id)
+            earliest = dates[0].get('date') if dates else '-'
+            visa.logger.info(f"登录检查通过 [{visa.facility_name(facility_id)}]: {len(dates)} 个日期，最早 {earliest}")
+    except Exception as e:
+        visa.logger.error(f"登录检查失败: {e}")
+        return 1
+    finally:
+        visa.close_browsers()
+        visa.close_services()
+    return 0
+
+
+def cmd_supervise(args):
+    import supervisor
+    supervisor.main(["--config", args.config] if args.config else [])
+
+
+def cmd_multi(args):
+    import asyncio
+    import multi
+    multi.setup_logging(multi.config)
+    asyncio.run(multi.main())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="美签预约改期工具")
+    parser.add_argument("--config", help="配置文件路径（默认 ./config.ini，也可用环境变量 VISA_CONFIG）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("poll", help="轮询并自动预约").set_defaults(func=cmd_poll)
+    sub.add_parser("dry-run", help="轮询但不提交预约").set_defaults(func=cmd_dry_run)
+    book = sub.add_parser("book", help="立即尝试预约指定日期")
+    book.add_argument("--date", required=True, help="YYYY-MM-DD")
+    book.add_argument("--facility", help="使馆 id，默认 FACILITY_ID")
+    book.set_defaults(func=cmd_book)
+    sub.add_parser("login-check", help="检查登录和 days 接口是否可用").set_defaults(func=cmd_login_check)
+    sub.add_parser("multi", help="多申请人模式").set_defaults(func=cmd_multi)
+    sub.add_parser("supervise", help="以子进程运行并监管轮询 worker").set_defaults(func=cmd_supervise)
+    args = parser.parse_args(argv)
+
+    # 必须在导入 visa 之前设置，visa 导入时读取配置
+    if args.config:
+        os.environ["VISA_CONFIG"] = args.config
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
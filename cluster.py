@@ -0,0 +1,227 @@
+# cluster.py
+# 多节点分片轮询：多台机器（各自的 IP 和限速）共用一个 SQLite 协调库（共享磁盘上的文件），
+# 按存活节点把使馆分片分配给各节点，每个节点只轮询分到的使馆，发现的变化写入库中，其他节点读取后同样参与预约
+#
+#   nodes    每个节点的租约，节点每轮轮询和等待期间续约，过期即视为掉线，其分片在下一轮被其他节点接手
+#   leases   当前的分片分配（shard, node, expires），只用于查看
+#   changes  各节点发布的可预约日期快照，按 id 增量读取，定期清理
+#
+# 分配规则只依赖存活节点列表，所有节点算出的结果相同：节点数少于分片数时按轮转分给各节点；
+# 节点数多于分片数时多个节点轮询同一个使馆，各自的随机间隔自然错开
+# 节点的轮询间隔按 分到的分片数 / 全部分片数 缩短（visa.idle），每个节点（每个 IP）的请求速率与单机运行时相同，
+# 每个使馆的检测频率随节点数线性增长
+#
+# 查看：python cluster.py --db cluster.db status
+#
+# 协调库不使用 WAL（WAL 依赖共享内存，不能放在网络文件系统上），写入都很小，靠 busy_timeout 排队
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+
+from change_detector import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    node TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    shard TEXT NOT NULL,
+    node TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (shard, node)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    node TEXT NOT NULL,
+    shard TEXT NOT NULL,
+    dates TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_ts ON changes (ts);
+"""
+
+CHANGE_KEEP_SECONDS = 600
+WAIT_STEP = 0.2
+
+
+def connect(path, timeout=10):
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def default_node_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def assign(shards, nodes):
+    # 返回 {node: [shard, ...]}；shards 和 nodes 都会先排序，保证各节点结果一致
+    shards, nodes = sorted(shards), sorted(nodes)
+    plan = {node: [] for node in nodes}
+    if not shards or not nodes:
+        return plan
+    if len(nodes) <= len(shards):
+        for i, shard in enumerate(shards):
+            plan[nodes[i % len(nodes)]].append(shard)
+    else:
+        for i, node in enumerate(nodes):
+            plan[node].append(shards[i % len(shards)])
+    return plan
+
+
+class ClusterNode:
+    def __init__(self, path, node_id=None, lease_seconds=30):
+        self.path = path
+        self.node_id = node_id or default_node_id()
+        self.lease_seconds = lease_seconds
+        self.dates = {}           # shard -> 最新的可预约日期列表（包括本节点发布的）
+        self._conn = connect(path)
+        self._owned = None
+        self._last_id = 0
+        self._last_prune = 0
+        self._renewed_at = time.monotonic()
+        now = time.time()
+        self._conn.execute("INSERT OR REPLACE INTO nodes (node, started, expires) VALUES (?, ?, ?)",
+                           (self.node_id, now, now + lease_seconds))
+        # 先读各使馆最近一次快照作为基线
+        for change_id, shard, dates in self._conn.execute(
+                "SELECT id, shard, dates FROM changes WHERE id IN (SELECT MAX(id) FROM changes GROUP BY shard)"):
+            self.dates[shard] = json.loads(dates)
+            self._last_id = max(self._last_id, change_id)
+        logger.info(f"已加入集群 {path}，节点 {self.node_id}")
+
+    def sync(self, shards):
+        # 续约并按当前存活节点重新分配，返回本节点负责的分片
+        now = time.time()
+        shards = [str(s) for s in shards]
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO nodes (node, started, expires) VALUES "
+                         "(?, COALESCE((SELECT started FROM nodes WHERE node = ?), ?), ?)",
+                         (self.node_id, self.node_id, now, now + self.lease_seconds))
+            conn.execute("DELETE FROM nodes WHERE expires < ?", (now,))
+            nodes = [row[0] for row in conn.execute("SELECT node FROM nodes")]
+            owned = assign(shards, nodes)[self.node_id]
+            conn.execute("DELETE FROM leases WHERE node = ? OR expires < ?", (self.node_id, now))
+            conn.executemany("INSERT INTO leases (shard, node, expires) VALUES (?, ?, ?)",
+                             [(shard, self.node_id, now + self.lease_seconds) for shard in owned])
+            if now - self._last_prune > CHANGE_KEEP_SECONDS:
+                # 每个分片至少保留最后一条快照，给新加入的节点做基线
+                conn.execute("DELETE FROM changes WHERE ts < ? AND id NOT IN "
+                             "(SELECT MAX(id) FROM changes GROUP BY shard)", (now - CHANGE_KEEP_SECONDS,))
+                self._last_prune = now
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._renewed_at = time.monotonic()
+        if owned != self._owned:
+            logger.info(f"集群分片变化: {len(nodes)} 个节点，本节点负责 {owned}")
+            self._owned = owned
+        return owned
+
+    def renew(self):
+        # 只续约不重新分配；两次轮询之间等待较长时（自适应间隔、熔断等待）由 wait() 定期调用
+        expires = time.time() + self.lease_seconds
+        self._conn.execute("UPDATE nodes SET expires = ? WHERE node = ?", (expires, self.node_id))
+        self._conn.execute("UPDATE leases SET expires = ? WHERE node = ?", (expires, self.node_id))
+        self._renewed_at = time.monotonic()
+
+    def publish(self, shard, dates):
+        shard = str(shard)
+        self.dates[shard] = list(dates)
+        self._conn.execute("INSERT INTO changes (ts, node, shard, dates) VALUES (?, ?, ?, ?)",
+                           (time.time(), self.node_id, shard, json.dumps(list(dates))))
+
+    def poll(self):
+        # 读取其他节点发布的新快照，返回相对本地已知日期的 ChangeEvent
+        rows = self._conn.execute("SELECT id, node, shard, dates FROM changes WHERE id > ? ORDER BY id",
+                                  (self._last_id,)).fetchall()
+        events = []
+        for change_id, node, shard, dates in rows:
+            self._last_id = change_id
+            if node == self.node_id:
+                continue
+            dates = json.loads(dates)
+            old = self.dates.get(shard)
+            self.dates[shard] = dates
+            added = sorted(set(dates) - set(old or ()))
+            removed = sorted(set(old or ()) - set(dates))
+            if old is None or added or removed:
+                events.append(ChangeEvent(shard, added, removed, old is None))
+        return events
+
+    def wait(self, timeout, wake_on_change=True):
+        # 代替 time.sleep：其他节点发布了变化时提前返回；等待期间按 lease_seconds / 3 续约，不会因为等待而掉线
+        deadline = time.monotonic() + timeout
+        while True:
+            if time.monotonic() - self._renewed_at >= self.lease_seconds / 3:
+                self.renew()
+            if wake_on_change:
+                row = self._conn.execute("SELECT MAX(id) FROM changes WHERE node != ?", (self.node_id,)).fetchone()
+                if row[0] is not None and row[0] > self._last_id:
+                    return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(WAIT_STEP, remaining))
+
+    def results(self, shards=None):
+        # 与 fetch_all 相同的格式，可直接交给 rank_candidates
+        return {shard: [{"date": d} for d in dates] for shard, dates in self.dates.items()
+                if shards is None or shard in shards}
+
+    def close(self):
+        # 主动退出时立即释放租约，其他节点下一轮就能接手
+        try:
+            self._conn.execute("DELETE FROM nodes WHERE node = ?", (self.node_id,))
+            self._conn.execute("DELETE FROM leases WHERE node = ?", (self.node_id,))
+        except sqlite3.Error as e:
+            logger.warning(f"释放集群租约失败: {e}")
+        self._conn.close()
+
+
+def _fmt_ts(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多节点分片轮询的协调库")
+    parser.add_argument("--db", default="cluster.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="存活节点、分片分配和最近的变化")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        sys.exit(f"协调库不存在: {args.db}")
+    conn = connect(args.db)
+
+    now = time.time()
+    print("节点:")
+    for node, started, expires in conn.execute("SELECT node, started, expires FROM nodes ORDER BY node"):
+        state = "存活" if expires >= now else "已过期"
+        print(f"  {node}  启动于 {_fmt_ts(started)}  {state}")
+    print("分片:")
+    for shard, node, expires in conn.execute("SELECT shard, node, expires FROM leases ORDER BY shard, node"):
+        print(f"  facility={shard}  {node}  租约到 {_fmt_ts(expires)}")
+    print("最近的变化:")
+    for ts, node, shard, dates in conn.execute(
+            "SELECT ts, node, shard, dates FROM changes ORDER BY id DESC LIMIT 10"):
+        dates = json.loads(dates)
+        print(f"  {_fmt_ts(ts)}  facility={shard}  {node}  {len(dates)} 个日期，最早 {dates[0] if dates else '-'}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# date_rules.py
+# 可接受日期规则：早于当前预约、最早/最晚日期、排除的日期段、允许的星期几、最少提前天数
+# 规则编译成一个判断函数（只包含配置了的检查，日期边界直接按 ISO 字符串比较，不逐个 strptime），
+# 每天编译一次，对全部候选日期一次性过滤，返回按原顺序排列的全部可接受候选，而不是只看第一个日期
+#
+# [RULES]
+# EARLIEST = 2026-11-01
+# LATEST = 2027-03-31
+# BLACKOUTS = 2026-12-20:2027-01-05, 2027-02-14
+# WEEKDAYS = Mon, Tue, Wed, Thu, Fri
+# MIN_NOTICE_DAYS = 3
+from datetime import date as date_cls, timedelta
+
+WEEKDAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def parse_blackouts(value):
+    # "2026-12-20:2027-01-05, 2027-02-14" -> [("2026-12-20", "2027-01-05"), ("2027-02-14", "2027-02-14")]
+    ranges = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        start, _, end = item.partition(":")
+        start = date_cls.fromisoformat(start.strip()).isoformat()
+        end = date_cls.fromisoformat(end.strip()).isoformat() if end.strip() else start
+        ranges.append((start, end))
+    return sorted(ranges)
+
+
+def parse_weekdays(value):
+    # "Mon, Tue" 或 "0, 1" -> {0, 1}；未配置返回 None（不限制）
+    days = set()
+    for item in (value or "").split(","):
+        item = item.strip().lower()
+        if not item:
+            continue
+        days.add(int(item) if item.isdigit() else WEEKDAY_NAMES.index(item[:3]))
+    return days or None
+
+
+class DateRules:
+    def __init__(self, before, earliest=None, latest=None, blackouts=(), weekdays=None,
+                 min_notice_days=0, condition=None):
+        # before: 当前预约日期（不含）；condition(month, day) 为额外的自定义条件
+        self.before = date_cls.fromisoformat(before).isoformat()
+        self.earliest = date_cls.fromisoformat(earliest).isoformat() if earliest else None
+        self.latest = date_cls.fromisoformat(latest).isoformat() if latest else None
+        self.blackouts = list(blackouts)
+        self.weekdays = set(weekdays) if weekdays else None
+        self.min_notice_days = min_notice_days
+        self.condition = condition
+        self._compiled = None
+
+    def compile(self, today=None):
+        # 返回 accept(date_str) -> bool；最少提前天数依赖今天的日期，按 (今天, 当前预约日期) 缓存，
+        # 日期变了或 before 被调整（提交结果不确定时）才重新编译
+        today = today or date_cls.today()
+        key = (today, self.before)
+        compiled = self._compiled
+        if compiled is not None and compiled[0] == key:
+            return compiled[1]
+        low = self.earliest
+        if self.min_notice_days:
+            notice = (today + timedelta(days=self.min_notice_days)).isoformat()
+            low = max(low, notice) if low else notice
+        # 上界统一成“不含”的形式
+        high = self.before
+        if self.latest:
+            high = min(high, (date_cls.fromisoformat(self.latest) + timedelta(days=1)).isoformat())
+        blackouts = self.blackouts
+        weekdays = self.weekdays
+        condition = self.condition
+
+        checks = []
+        if low:
+            checks.append(lambda s, d: s >= low)
+        checks.append(lambda s, d: s < high)
+        if blackouts:
+            checks.append(lambda s, d: not any(start <= s <= end for start, end in blackouts))
+        needs_date = weekdays is not None or condition is not None
+        if weekdays is not None:
+            checks.append(lambda s, d: d.weekday() in weekdays)
+        if condition is not None:
+            checks.append(lambda s, d: condition(d.month, d.day))
+
+        def accept(date_str):
+            d = date_cls.fromisoformat(date_str) if needs_date else None
+            return all(check(date_str, d) for check in checks)
+        self._compiled = (key, accept)
+        return accept
+
+    def filter(self, candidates, today=None):
+        # candidates: [(date, facility_id), ...]，保持原有的排序
+        accept = self.compile(today)
+        return [c for c in candidates if accept(c[0])]
+
+    def describe(self):
+        parts = [f"早于 {self.before}"]
+        if self.earliest:
+            parts.append(f"不早于 {self.earliest}")
+        if self.latest:
+            parts.append(f"不晚于 {self.latest}")
+        if self.blackouts:
+            parts.append(f"排除 {', '.join(s if s == e else f'{s}~{e}' for s, e in self.blackouts)}")
+        if self.weekdays is not None:
+            parts.append(f"星期 {', '.join(WEEKDAY_NAMES[d].title() for d in sorted(self.weekdays))}")
+        if self.min_notice_days:
+            parts.append(f"至少提前 {self.min_notice_days} 天")
+        return "，".join(parts)
+
+
+def load_rules(config, before, condition=None, section='RULES'):
+    # 从 config.ini 的 [RULES] 读取，没有该段时只保留“早于当前预约”这一条
+    rules = config[section] if config.has_section(section) else {}
+    return DateRules(
+        before,
+        earliest=rules.get('EARLIEST') or None,
+        latest=rules.get('LATEST') or None,
+        blackouts=parse_blackouts(rules.get('BLACKOUTS')),
+        weekdays=parse_weekdays(rules.get('WEEKDAYS')),
+        min_notice_days=int(rules.get('MIN_NOTICE_DAYS') or 0),
+        condition=condition,
+    )
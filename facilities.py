@@ -0,0 +1,73 @@
+# facilities.py
+# 多使馆并发查询：每轮同时请求所有 facility 的 days 接口，按偏好权重合并成一个排序后的候选列表
+#
+# 权重单位为天：FACILITY_WEIGHTS = 89:14 表示 89 号使馆的日期要比权重为 0 的使馆早 14 天以上才会排在前面
+import logging
+from datetime import date as date_cls
+
+from ais_http import SessionExpired
+
+logger = logging.getLogger(__name__)
+
+# 加拿大各使馆的 facility id
+FACILITY_NAMES = {
+    "89": "Calgary",
+    "90": "Halifax",
+    "91": "Montreal",
+    "92": "Ottawa",
+    "93": "Quebec City",
+    "94": "Toronto",
+    "95": "Vancouver",
+}
+
+
+def parse_facility_ids(value, default):
+    ids = [fid.strip() for fid in (value or "").split(",") if fid.strip()]
+    return ids or [default]
+
+
+def parse_facility_weights(value):
+    weights = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        fid, weight = item.split(":", 1)
+        weights[fid.strip()] = int(weight)
+    return weights
+
+
+def facility_name(facility_id):
+    return FACILITY_NAMES.get(str(facility_id), str(facility_id))
+
+
+def fetch_all(executor, fetch, facility_ids):
+    # fetch(facility_id) -> dates；所有请求并发发出，单个使馆出错不影响其他使馆
+    futures = {fid: executor.submit(fetch, fid) for fid in facility_ids}
+    results = {}
+    expired = None
+    for fid, future in futures.items():
+        try:
+            results[fid] = future.result()
+        except SessionExpired as e:
+            expired = e
+        except Exception as e:
+            logger.warning(f"查询使馆 {facility_name(fid)} 失败: {e}")
+            results[fid] = []
+    if expired is not None:
+        raise expired
+    return results
+
+
+def rank_candidates(results, weights):
+    # 返回 [(date, facility_id), ...]，按 日期 + 权重天数 从小到大排序
+    ranked = []
+    for fid, dates in results.items():
+        penalty = weights.get(fid, 0)
+        for item in dates:
+            date_str = item.get('date')
+            if not date_str:
+                continue
+            score = date_cls.fromisoformat(date_str).toordinal() + penalty
+            ranked.append((score, date_str, fid))
+    ranked.sort()
+    return [(date_str, fid) for _, date_str, fid in ranked]
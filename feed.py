@@ -0,0 +1,178 @@
+# feed.py
+# 单轮询多订阅：每个使馆只由一个进程轮询 days 接口，变化通过本机 Unix socket 推送给任意多个订阅进程，
+# 订阅进程各自决定是否预约，上游请求数只随使馆数量增长，不随申请人数量增长
+#
+# 协议：每行一个 JSON
+#   订阅者 -> 发布者  {"facilities": ["95", "89"]}      空列表表示全部使馆
+#   发布者 -> 订阅者  {"facility": "95", "dates": ["2026-11-03", ...], "added": [...], "removed": [...],
+#                      "first": false, "published_at": 1760000000.0}
+# 订阅者连上后先收到每个使馆的最新快照（first 为 true），之后只收到变化
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+
+from change_detector import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+SEND_TIMEOUT = 1.0
+
+
+def _encode(message):
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+
+class FeedPublisher:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._subscribers = []    # [(sock, facilities)]
+        self._snapshots = {}      # facility -> 最新一条消息
+        self._closed = False
+        self._server = self._bind()
+        threading.Thread(target=self._accept_loop, name="feed-accept", daemon=True).start()
+        logger.info(f"可预约日期推送已启动: {path}")
+
+    def _bind(self):
+        if os.path.exists(self.path):
+            # 上一个发布者崩溃留下的 socket 文件；如果还能连上说明已有发布者在运行
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)
+            else:
+                raise RuntimeError(f"已有发布者在运行: {self.path}")
+            finally:
+                probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(64)
+        return server
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handshake, args=(conn,), name="feed-handshake", daemon=True).start()
+
+    def _handshake(self, conn):
+        try:
+            conn.settimeout(5)
+            line = conn.makefile("rb").readline()
+            facilities = {str(f) for f in json.loads(line or b"{}").get("facilities") or []}
+            conn.settimeout(SEND_TIMEOUT)
+            with self._lock:
+                # 在锁内发送快照并登记，保证订阅者不会漏掉快照之后的变化
+                for facility, message in self._snapshots.items():
+                    if not facilities or facility in facilities:
+                        conn.sendall(_encode(dict(message, added=message["dates"], removed=[], first=True)))
+                self._subscribers.append((conn, facilities))
+                count = len(self._subscribers)
+        except (OSError, ValueError) as e:
+            logger.warning(f"订阅者握手失败: {e}")
+            conn.close()
+            return
+        logger.info(f"新的订阅者已连接，当前 {count} 个")
+
+    def publish(self, event, dates):
+        # event: change_detector.ChangeEvent；dates: 该使馆当前全部可预约日期字符串
+        facility = str(event.key)
+        message = {
+            "facility": facility, "dates": list(dates), "added": list(event.added),
+            "removed": list(event.removed), "first": event.first, "published_at": time.time(),
+        }
+        data = _encode(message)
+        with self._lock:
+            self._snapshots[facility] = message
+            alive = []
+            for conn, facilities in self._subscribers:
+                if facilities and facility not in facilities:
+                    alive.append((conn, facilities))
+                    continue
+                try:
+                    conn.sendall(data)
+                except OSError as e:
+                    # 断开或长时间不读的订阅者直接丢弃，它重连后会重新拿到快照
+                    logger.info(f"订阅者已断开: {e}")
+                    conn.close()
+                    continue
+                alive.append((conn, facilities))
+            self._subscribers = alive
+
+    def close(self):
+        self._closed = True
+        self._server.close()
+        with self._lock:
+            for conn, _ in self._subscribers:
+                conn.close()
+            self._subscribers = []
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class FeedSubscriber:
+    def __init__(self, path, facilities=(), reconnect_delay=2.0):
+        self.path = path
+        self.facilities = [str(f) for f in facilities]
+        self.reconnect_delay = reconnect_delay
+        self.dates = {}           # facility -> 最新的可预约日期列表
+        self._queue = queue.Queue()
+        self._closed = False
+        self._sock = None
+        threading.Thread(target=self._read_loop, name="feed-subscriber", daemon=True).start()
+
+    def _read_loop(self):
+        while not self._closed:
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+                sock.sendall(_encode({"facilities": self.facilities}))
+                self._sock = sock
+                logger.info(f"已连接到可预约日期推送: {self.path}")
+                for line in sock.makefile("rb"):
+                    self._queue.put(json.loads(line))
+                logger.warning("发布者关闭了连接")
+            except (OSError, ValueError) as e:
+                logger.warning(f"无法连接到发布者 {self.path}: {e}，{self.reconnect_delay:.0f} 秒后重试")
+            finally:
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+            time.sleep(self.reconnect_delay)
+
+    def wait(self, timeout=None):
+        # 阻塞直到收到至少一条变化，返回期间收到的全部 ChangeEvent（超时返回空列表）
+        try:
+            messages = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                messages.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        events = []
+        for message in messages:
+            self.dates[message["facility"]] = message["dates"]
+            events.append(ChangeEvent(message["facility"], message["added"], message["removed"], message["first"]))
+        latency = time.time() - messages[-1]["published_at"]
+        logger.debug(f"收到 {len(messages)} 条推送，延迟 {latency * 1000:.1f} ms")
+        return events
+
+    def results(self):
+        # 与 fetch_all 相同的格式，可直接交给 rank_candidates
+        return {facility: [{"date": d} for d in dates] for facility, dates in self.dates.items()}
+
+    def close(self):
+        self._closed = True
+        if self._sock is not None:
+            self._sock.close()
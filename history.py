@@ -0,0 +1,196 @@
+# history.py
+# 可预约日期历史库（SQLite）：
+#   polls  每次轮询一行（时间、使馆、日期数量、最早日期），按保留天数清理
+#   spans  每个日期的可见区间（首次出现 ~ 最后一次看到），日期一直在时只更新 last_seen，不会随轮询次数增长
+# 写入在后台线程完成，轮询线程只入队
+#
+# 查询示例：
+#   python history.py appeared --before 2026-05-01            # 哪些早于 5 月 1 日的日期出现过、持续了多久
+#   python history.py polls --since 2026-10-01 --facility 95  # 轮询记录
+#   python history.py compact --keep-days 30                  # 手动清理
+import os
+import sys
+import time
+import queue
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS polls (
+    ts INTEGER NOT NULL,
+    facility TEXT NOT NULL,
+    n_dates INTEGER NOT NULL,
+    earliest TEXT
+);
+CREATE INDEX IF NOT EXISTS polls_ts ON polls (ts);
+CREATE TABLE IF NOT EXISTS spans (
+    id INTEGER PRIMARY KEY,
+    facility TEXT NOT NULL,
+    date TEXT NOT NULL,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    open INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS spans_date ON spans (date, facility);
+CREATE INDEX IF NOT EXISTS spans_open ON spans (facility, open);
+CREATE INDEX IF NOT EXISTS spans_last_seen ON spans (last_seen);
+"""
+
+COMPACT_INTERVAL = 3600
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    # 新建库时开启增量 vacuum，清理后可以把空间还给磁盘
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def compact(conn, keep_days, span_keep_days):
+    now = int(time.time())
+    polls = conn.execute("DELETE FROM polls WHERE ts < ?", (now - keep_days * 86400,)).rowcount
+    spans = conn.execute("DELETE FROM spans WHERE open = 0 AND last_seen < ?",
+                         (now - span_keep_days * 86400,)).rowcount
+    conn.commit()
+    conn.execute("PRAGMA incremental_vacuum")
+    return polls, spans
+
+
+class HistoryStore:
+    def __init__(self, path, keep_days=30, span_keep_days=365, maxsize=1000):
+        self.path = path
+        self.keep_days = keep_days
+        self.span_keep_days = span_keep_days
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="history", daemon=True)
+        self._thread.start()
+
+    def record(self, facility, dates, ts=None):
+        # 轮询线程调用：只入队，队列满时丢弃本次记录
+        try:
+            self._queue.put_nowait((int(ts or time.time()), str(facility), dates))
+        except queue.Full:
+            logger.warning("历史记录队列已满，丢弃一次轮询结果")
+
+    def close(self, timeout=10):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        conn = connect(self.path)
+        # 内存中保存当前打开的区间：{facility: {date: span_id}}
+        open_spans = {}
+        for span_id, facility, date in conn.execute("SELECT id, facility, date FROM spans WHERE open = 1"):
+            open_spans.setdefault(facility, {})[date] = span_id
+        last_compact = 0
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(conn, open_spans, *item)
+                if time.time() - last_compact > COMPACT_INTERVAL:
+                    compact(conn, self.keep_days, self.span_keep_days)
+                    last_compact = time.time()
+            except sqlite3.Error as e:
+                logger.warning(f"写入历史记录失败: {e}")
+        conn.close()
+
+    def _write(self, conn, open_spans, ts, facility, dates):
+        present = {d.get('date') for d in dates if d.get('date')}
+        spans = open_spans.setdefault(facility, {})
+        conn.execute("INSERT INTO polls (ts, facility, n_dates, earliest) VALUES (?, ?, ?, ?)",
+                     (ts, facility, len(present), min(present) if present else None))
+
+        removed = [spans.pop(d) for d in list(spans) if d not in present]
+        if removed:
+            conn.executemany("UPDATE spans SET open = 0 WHERE id = ?", [(i,) for i in removed])
+        # 仍然可见的区间一次性更新
+        conn.execute("UPDATE spans SET last_seen = ? WHERE facility = ? AND open = 1", (ts, facility))
+        for d in sorted(present - spans.keys()):
+            cur = conn.execute(
+                "INSERT INTO spans (facility, date, first_seen, last_seen) VALUES (?, ?, ?, ?)",
+                (facility, d, ts, ts))
+            spans[d] = cur.lastrowid
+        conn.commit()
+
+
+def _fmt_ts(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _to_ts(value):
+    return int(datetime.strptime(value, "%Y-%m-%d").timestamp()) if value else None
+
+
+def query_appeared(conn, before, facility=None, since=None):
+    sql = "SELECT date, facility, first_seen, last_seen, open FROM spans WHERE date < ?"
+    args = [before]
+    if facility:
+        sql += " AND facility = ?"
+        args.append(facility)
+    if since:
+        sql += " AND last_seen >= ?"
+        args.append(_to_ts(since))
+    return conn.execute(sql + " ORDER BY first_seen", args).fetchall()
+
+
+def query_polls(conn, since=None, until=None, facility=None):
+    sql = "SELECT ts, facility, n_dates, earliest FROM polls WHERE ts >= ? AND ts < ?"
+    args = [_to_ts(since) or 0, _to_ts(until) or int(time.time()) + 1]
+    if facility:
+        sql += " AND facility = ?"
+        args.append(facility)
+    return conn.execute(sql + " ORDER BY ts", args).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="可预约日期历史查询")
+    parser.add_argument("--db", default="history.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("appeared", help="早于某日期的日期何时出现、持续多久")
+    p.add_argument("--before", required=True, help="YYYY-MM-DD")
+    p.add_argument("--facility")
+    p.add_argument("--since", help="只看该日期之后仍可见的区间 YYYY-MM-DD")
+
+    p = sub.add_parser("polls", help="轮询记录")
+    p.add_argument("--since")
+    p.add_argument("--until")
+    p.add_argument("--facility")
+
+    p = sub.add_parser("compact", help="按保留天数清理")
+    p.add_argument("--keep-days", type=int, default=30)
+    p.add_argument("--span-keep-days", type=int, default=365)
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        sys.exit(f"历史库不存在: {args.db}")
+    conn = connect(args.db)
+
+    if args.command == "appeared":
+        for date, facility, first_seen, last_seen, still_open in query_appeared(
+                conn, args.before, args.facility, args.since):
+            duration = last_seen - first_seen
+            state = "仍可见" if still_open else "已消失"
+            print(f"{date}  facility={facility}  {_fmt_ts(first_seen)} ~ {_fmt_ts(last_seen)}"
+                  f"  持续 {duration // 60} 分 {duration % 60} 秒  {state}")
+    elif args.command == "polls":
+        for ts, facility, n_dates, earliest in query_polls(conn, args.since, args.until, args.facility):
+            print(f"{_fmt_ts(ts)}  facility={facility}  日期数={n_dates}  最早={earliest}")
+    elif args.command == "compact":
+        polls, spans = compact(conn, args.keep_days, args.span_keep_days)
+        print(f"已删除 {polls} 条轮询记录、{spans} 个区间")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# http_login.py
+# 纯 HTTP 登录：取登录页 CSRF token -> 直接提交表单 -> 检查登录后的 Continue 链接
+import re
+import logging
+
+from ais_http import new_session, extract_form_fields, DEFAULT_USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+REGEX_CONTINUE = re.compile(r"<a\b[^>]*>[^<]*Continue", re.IGNORECASE)
+
+
+class LoginError(Exception):
+    pass
+
+
+def http_login(base_url, country_code, username, password, session=None, timeout=30):
+    sign_in_url = f"{base_url}/{country_code}/niv/users/sign_in"
+    account_url = f"{base_url}/{country_code}/niv/account"
+
+    if session is None:
+        session = new_session(DEFAULT_USER_AGENT)
+    else:
+        session.cookies.clear()
+    session.headers.setdefault("User-Agent", DEFAULT_USER_AGENT)
+
+    logger.info("HTTP 登录: 获取登录页")
+    r = session.get(sign_in_url, timeout=timeout)
+    r.raise_for_status()
+    try:
+        token = extract_form_fields(r.text, ["authenticity_token"])["authenticity_token"]
+    except ValueError as e:
+        raise LoginError(f"登录页中未找到 authenticity_token: {e}")
+
+    data = {
+        "utf8": "✓",
+        "authenticity_token": token,
+        "user[email]": username,
+        "user[password]": password,
+        "policy_confirmed": "1",
+        "commit": "Sign In",
+    }
+    headers = {
+        "Referer": sign_in_url,
+        "X-CSRF-Token": token,
+        "X-Requested-With": "XMLHttpRequest",
+        "Accept": "*/*;q=0.5, text/javascript, application/javascript",
+    }
+    logger.info("HTTP 登录: 提交登录表单")
+    r = session.post(sign_in_url, data=data, headers=headers, timeout=timeout)
+    if r.status_code >= 400:
+        raise LoginError(f"登录表单提交失败，状态码 {r.status_code}")
+
+    logger.info("HTTP 登录: 检查登录后页面（Continue链接）")
+    r = session.get(account_url, timeout=timeout)
+    r.raise_for_status()
+    if not REGEX_CONTINUE.search(r.text):
+        raise LoginError("登录后页面中没有 Continue 链接，登录未成功")
+
+    logger.info("HTTP 登录成功")
+    return session
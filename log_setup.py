@@ -0,0 +1,182 @@
+# log_setup.py
+# 日志：调用方只把记录放进队列，格式化和写文件在后台线程完成；文件按大小或时间轮转并 gzip 压缩，
+# 可输出 JSON 结构化记录；“暂无更早日期”这类每轮都会出现的日志按时间窗口合并成一行汇总
+#
+# [LOG]
+# DIR = logs
+# FORMAT = json            json 或 text（只影响文件，控制台始终是文本）
+# MAX_BYTES = 10485760     单个文件超过该大小即轮转
+# ROTATE_HOURS = 24        距上次轮转超过该时间也轮转
+# BACKUP_COUNT = 10        保留的压缩文件数量
+# AGGREGATE_SECONDS = 300  重复日志的汇总间隔，0 表示不合并
+import os
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+import logging.handlers
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+# 后台线程检查汇总窗口是否结束的间隔
+SUMMARY_CHECK_SECONDS = 1.0
+
+# 按消息前缀合并的重复日志：只合并空闲等待和无日期的提示；
+# "获取可用日期成功" 等只在可预约日期变化时才输出，每条都要保留
+REPETITIVE_PREFIXES = (
+    "暂无可预约日期",
+    "⏳ 当前时间不在刷号时段内",
+)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    # 超过 maxBytes 或距上次轮转超过 rotate_seconds 时轮转，旧文件压缩成 .gz
+    def __init__(self, filename, maxBytes=0, backupCount=0, rotate_seconds=0, encoding=None):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+        self.rotate_seconds = rotate_seconds
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+        self.rollover_at = self._next_rollover()
+
+    def _next_rollover(self):
+        return time.time() + self.rotate_seconds if self.rotate_seconds else None
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover()
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+class RepeatSummaryFilter(logging.Filter):
+    # 同一前缀的日志在窗口内只放行第一条，之后计数；窗口结束时由 SummaryQueueListener 写出一条汇总，
+    # 重复停止（例如离开刷号时段）后汇总也会按时写出
+    def __init__(self, interval, prefixes=REPETITIVE_PREFIXES):
+        super().__init__()
+        self.interval = interval
+        self.prefixes = prefixes
+        self._windows = {}    # prefix -> [window_start, suppressed, last_record]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        message = record.getMessage()
+        prefix = next((p for p in self.prefixes if message.startswith(p)), None)
+        if prefix is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(prefix)
+            if window is None or now - window[0] >= self.interval:
+                # 上一个窗口的汇总还没写出时（后台线程还没轮到）合并到这一条里
+                if window is not None and window[1]:
+                    record.msg = f"{message}（过去 {now - window[0]:.0f} 秒内另有 {window[1]} 条相同日志）"
+                    record.args = None
+                self._windows[prefix] = [now, 0, None]
+                return True
+            window[1] += 1
+            window[2] = record
+            return False
+
+    def flush(self, force=False):
+        # 返回已经结束（force 时为全部）的窗口的汇总记录
+        now = time.monotonic()
+        summaries = []
+        with self._lock:
+            for prefix, (started, suppressed, last) in list(self._windows.items()):
+                if not force and now - started < self.interval:
+                    continue
+                del self._windows[prefix]
+                if suppressed:
+                    fields = {k: v for k, v in last.__dict__.items()
+                              if k not in ("created", "msecs", "relativeCreated", "asctime", "message")}
+                    fields.update(msg=f"{last.getMessage()}（过去 {now - started:.0f} 秒内共 {suppressed} 条相同日志未输出）",
+                                  args=None, exc_info=None, exc_text=None)
+                    summaries.append(logging.makeLogRecord(fields))
+        return summaries
+
+
+class SummaryQueueListener(logging.handlers.QueueListener):
+    # 队列空闲时定期写出到期的汇总；stop() 前把未到期的汇总也写完
+    def __init__(self, queue, *handlers, summary=None):
+        super().__init__(queue, *handlers)
+        self.summary = summary
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(timeout=SUMMARY_CHECK_SECONDS)
+            except queue.Empty:
+                if self.summary is not None:
+                    for record in self.summary.flush():
+                        self.handle(record)
+
+    def stop(self):
+        if self.summary is not None and self._thread is not None:
+            for record in self.summary.flush(force=True):
+                self.queue.put_nowait(record)
+        super().stop()
+
+
+def setup_logging(config=None):
+    # 在程序入口调用一次；导入模块时不再创建目录或打开文件
+    section = config['LOG'] if config is not None and config.has_section('LOG') else {}
+    log_dir = section.get('DIR', 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    file_handler = CompressingRotatingFileHandler(
+        os.path.join(log_dir, 'visa.log'),
+        maxBytes=int(section.get('MAX_BYTES', 10 * 1024 * 1024)),
+        backupCount=int(section.get('BACKUP_COUNT', 10)),
+        rotate_seconds=float(section.get('ROTATE_HOURS', 24)) * 3600,
+        encoding='utf-8',
+    )
+    if section.get('FORMAT', 'json').lower() == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    aggregate_seconds = float(section.get('AGGREGATE_SECONDS', 300))
+    summary = RepeatSummaryFilter(aggregate_seconds) if aggregate_seconds > 0 else None
+    if summary is not None:
+        queue_handler.addFilter(summary)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, section.get('LEVEL', 'INFO').upper(), logging.INFO))
+
+    listener = SummaryQueueListener(log_queue, file_handler, console_handler, summary=summary)
+    listener.start()
+    # 退出时把队列里剩余的日志写完
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,217 @@
+# metrics.py
+# 内置指标：各阶段耗时直方图、状态码/重新登录/预约计数、轮询速率
+# 通过本地 HTTP 端点以 Prometheus 文本格式暴露，并定期在日志中输出一行汇总
+import re
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def total(self, **match):
+        # 所有满足 match 的标签组合之和
+        with self._lock:
+            return sum(v for k, v in self._values.items() if set(match.items()) <= set(k))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}   # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def quantile(self, q, **labels):
+        # 按桶上界估计分位数
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            if not series or not series[-1]:
+                return None
+            target = q * series[-1]
+            for i, bound in enumerate(self.buckets):
+                if series[i] >= target:
+                    return bound
+            return float("inf")
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for i, bound in enumerate(self.buckets):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {series[i]}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text):
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+PHASE_SECONDS = REGISTRY.histogram("visa_phase_seconds", "Latency of each polling/booking phase")
+HTTP_RESPONSES = REGISTRY.counter("visa_http_responses_total", "HTTP responses by endpoint and status code")
+POLLS = REGISTRY.counter("visa_polls_total", "Completed availability polls")
+RELOGINS = REGISTRY.counter("visa_relogins_total", "Logins by reason")
+BOOKINGS = REGISTRY.counter("visa_bookings_total", "Booking attempts by result")
+
+ENDPOINT_PATTERNS = [
+    ("days", re.compile(r"/appointment/days/")),
+    ("times", re.compile(r"/appointment/times/")),
+    ("appointment", re.compile(r"/appointment$")),
+    ("sign_in", re.compile(r"/users/sign_in$")),
+    ("account", re.compile(r"/account$")),
+]
+
+
+def endpoint_of(url):
+    path = url.split("?", 1)[0]
+    for name, pattern in ENDPOINT_PATTERNS:
+        if pattern.search(path):
+            return name
+    return "other"
+
+
+def instrument_session(session):
+    # 通过 requests 的 response hook 统计所有响应的状态码
+    if getattr(session, "_metrics_instrumented", False):
+        return session
+    session.hooks["response"].append(_count_response)
+    session._metrics_instrumented = True
+    return session
+
+
+def _count_response(response, *args, **kwargs):
+    HTTP_RESPONSES.inc(endpoint=endpoint_of(response.url), status=str(response.status_code))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(host="127.0.0.1", port=9108, registry=REGISTRY):
+    handler = type("BoundMetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"指标端点已启动: http://{host}:{server.server_port}/metrics")
+    return server
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+def summary_line(interval, last_polls):
+    polls = POLLS.total()
+    rate = (polls - last_polls) / interval * 60
+    return polls, (
+        f"指标汇总: 轮询 {rate:.1f} 次/分"
+        f" | days p50 {_ms(PHASE_SECONDS.quantile(0.5, phase='days_request'))}"
+        f" p95 {_ms(PHASE_SECONDS.quantile(0.95, phase='days_request'))}"
+        f" | 401 {HTTP_RESPONSES.total(status='401')} 429 {HTTP_RESPONSES.total(status='429')}"
+        f" 5xx {sum(HTTP_RESPONSES.total(status=str(s)) for s in range(500, 600))}"
+        f" | 重新登录 {RELOGINS.total()} | 预约成功 {BOOKINGS.total(result='success')}"
+        f" 失败 {BOOKINGS.total(result='failure')}"
+    )
+
+
+def start_summary(interval=300):
+    def run():
+        last_polls = POLLS.total()
+        while True:
+            time.sleep(interval)
+            last_polls, line = summary_line(interval, last_polls)
+            logger.info(line)
+    threading.Thread(target=run, name="metrics-summary", daemon=True).start()
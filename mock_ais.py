@@ -0,0 +1,293 @@
+# mock_ais.py
+# 本地 AIS 替身服务器：实现脚本用到的全部接口，用于离线测试和性能基准
+#   GET  /{cc}/niv/users/sign_in                                   登录页（含 CSRF token）
+#   POST /{cc}/niv/users/sign_in                                   登录
+#   GET  /{cc}/niv/account                                         登录后页面（Continue 链接）
+#   GET  /{cc}/niv/schedule/{id}/appointment/days/{facility}.json  可预约日期（支持 ETag）
+#   GET  /{cc}/niv/schedule/{id}/appointment/times/{facility}.json 可预约时间
+#   GET  /{cc}/niv/schedule/{id}/appointment                       预约表单
+#   POST /{cc}/niv/schedule/{id}/appointment                       提交预约
+#
+# 场景文件（JSON）示例：
+#   {
+#     "facilities": {"95": {"2027-03-01": ["08:00", "09:15"]}},
+#     "session_ttl": 600,
+#     "timeline": [
+#       {"at": 5,  "action": "add",      "facility": "95", "date": "2026-11-02", "times": ["10:00"]},
+#       {"at": 20, "action": "remove",   "facility": "95", "date": "2026-11-02"},
+#       {"at": 30, "action": "expire_sessions"},
+#       {"at": 40, "action": "throttle", "seconds": 10},
+#       {"at": 60, "action": "latency",  "ms": 800}
+#     ]
+#   }
+# 运行: python mock_ais.py --port 8080 --scenario scenario.json，然后在 config.ini 中设置 BASE_URL = http://127.0.0.1:8080
+import re
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from http.cookies import SimpleCookie
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SESSION_COOKIE = "_yatri_session"
+
+SIGN_IN_PAGE = """<html><head><meta name="csrf-token" content="{token}"></head><body>
+<form action="/{cc}/niv/users/sign_in" method="post">
+<input type="hidden" name="utf8" value="&#x2713;"><input type="hidden" name="authenticity_token" value="{token}">
+<input id="user_email" name="user[email]"><input id="user_password" name="user[password]" type="password">
+<div class="icheckbox"><input type="checkbox" name="policy_confirmed" value="1"></div>
+<input type="submit" name="commit" value="Sign In">
+</form></body></html>"""
+
+ACCOUNT_PAGE = """<html><body><a href="/{cc}/niv/schedule/{schedule_id}/continue_actions">Continue</a></body></html>"""
+
+APPOINTMENT_PAGE = """<html><head><meta name="csrf-token" content="{token}"></head><body>
+<form action="/{cc}/niv/schedule/{schedule_id}/appointment" method="post">
+<input type="hidden" name="utf8" value="&#x2713;">
+<input type="hidden" name="authenticity_token" value="{token}">
+<input type="hidden" name="confirmed_limit_message" value="1">
+<input type="hidden" name="use_consulate_appointment_capacity" value="true">
+</form></body></html>"""
+
+ROUTES = [
+    ("GET", re.compile(r"^/(?P<cc>[\w-]+)/niv/users/sign_in$"), "sign_in_page"),
+    ("POST", re.compile(r"^/(?P<cc>[\w-]+)/niv/users/sign_in$"), "sign_in"),
+    ("GET", re.compile(r"^/(?P<cc>[\w-]+)/niv/account$"), "account"),
+    ("GET", re.compile(r"^/(?P<cc>[\w-]+)/niv/schedule/(?P<sid>\d+)/appointment/days/(?P<fid>\d+)\.json$"), "days"),
+    ("GET", re.compile(r"^/(?P<cc>[\w-]+)/niv/schedule/(?P<sid>\d+)/appointment/times/(?P<fid>\d+)\.json$"), "times"),
+    ("GET", re.compile(r"^/(?P<cc>[\w-]+)/niv/schedule/(?P<sid>\d+)/appointment$"), "appointment_page"),
+    ("POST", re.compile(r"^/(?P<cc>[\w-]+)/niv/schedule/(?P<sid>\d+)/appointment$"), "book"),
+]
+
+
+class Scenario:
+    def __init__(self, facilities=None, session_ttl=3600, timeline=None, latency_ms=0):
+        # facilities: {facility_id: {date: [times]}}
+        self.lock = threading.Lock()
+        self.facilities = {fid: dict(dates) for fid, dates in (facilities or {}).items()}
+        self.session_ttl = session_ttl
+        self.latency_ms = latency_ms
+        self.throttled_until = 0.0
+        self.timeline = sorted(timeline or [], key=lambda e: e["at"])
+        self.sessions = {}        # session id -> {"logged_in": bool, "created": ts}
+        self.tokens = set()
+        self.released_at = {}     # (facility, date) -> 出现时间，用于计算检测到预约的延迟
+        self.bookings = []        # [{"facility", "date", "time", "latency"}]
+        self.requests = {}        # 路由名 -> 请求次数
+        self.started = time.monotonic()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("facilities"), data.get("session_ttl", 3600),
+                   data.get("timeline"), data.get("latency_ms", 0))
+
+    def advance(self):
+        # 执行已经到时间的时间线事件
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            while self.timeline and self.timeline[0]["at"] <= elapsed:
+                self.apply(self.timeline.pop(0))
+
+    def apply(self, event):
+        action = event["action"]
+        if action == "add":
+            self.add_slot(event["facility"], event["date"], event.get("times", ["08:00"]))
+        elif action == "remove":
+            self.facilities.get(str(event["facility"]), {}).pop(event["date"], None)
+        elif action == "expire_sessions":
+            self.sessions.clear()
+        elif action == "throttle":
+            self.throttled_until = time.monotonic() + event["seconds"]
+        elif action == "latency":
+            self.latency_ms = event["ms"]
+
+    def add_slot(self, facility, date, times):
+        facility = str(facility)
+        self.facilities.setdefault(facility, {})[date] = list(times)
+        self.released_at[(facility, date)] = time.monotonic()
+
+    def new_session(self, logged_in=False):
+        sid = uuid.uuid4().hex
+        self.sessions[sid] = {"logged_in": logged_in, "created": time.monotonic()}
+        return sid
+
+    def session_valid(self, sid):
+        session = self.sessions.get(sid)
+        if not session or not session["logged_in"]:
+            return False
+        return time.monotonic() - session["created"] < self.session_ttl
+
+    def new_token(self):
+        token = uuid.uuid4().hex
+        self.tokens.add(token)
+        return token
+
+
+class MockAISHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头和正文分两次写出，不关 Nagle 会叠加 40ms 的延迟确认
+    disable_nagle_algorithm = True
+    scenario = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        scenario = self.scenario
+        scenario.advance()
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()} if length else {}
+        cookie = SimpleCookie(self.headers.get("Cookie") or "")
+        self.sid = cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+
+        if scenario.latency_ms:
+            time.sleep(scenario.latency_ms / 1000)
+        if time.monotonic() < scenario.throttled_until:
+            return self.reply(429, "Too Many Requests", "text/plain")
+
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                with scenario.lock:
+                    scenario.requests[name] = scenario.requests.get(name, 0) + 1
+                return getattr(self, name)(**match.groupdict())
+        self.reply(404, "Not Found", "text/plain")
+
+    def reply(self, status, body, content_type="text/html", set_session=None, headers=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if set_session:
+            self.send_header("Set-Cookie", f"{SESSION_COOKIE}={set_session}; path=/; HttpOnly")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def require_login(self):
+        with self.scenario.lock:
+            valid = self.scenario.session_valid(self.sid)
+        if not valid:
+            self.reply(401, '{"error":"Your session expired, please sign in again to continue."}', "application/json")
+        return valid
+
+    def sign_in_page(self, cc):
+        with self.scenario.lock:
+            sid = self.scenario.new_session()
+            token = self.scenario.new_token()
+        self.reply(200, SIGN_IN_PAGE.format(cc=cc, token=token), set_session=sid)
+
+    def sign_in(self, cc):
+        with self.scenario.lock:
+            ok = (self.sid in self.scenario.sessions
+                  and self.form.get("authenticity_token") in self.scenario.tokens
+                  and self.form.get("user[email]") and self.form.get("user[password]")
+                  and self.form.get("policy_confirmed") == "1")
+            sid = self.scenario.new_session(logged_in=True) if ok else None
+        if not ok:
+            return self.reply(401, "Invalid email or password.", "text/plain")
+        self.reply(200, f'window.location.href = "/{cc}/niv/account"', "text/javascript", set_session=sid)
+
+    def account(self, cc):
+        with self.scenario.lock:
+            valid = self.scenario.session_valid(self.sid)
+        if not valid:
+            return self.reply(200, "<html><body>Sign in</body></html>")
+        self.reply(200, ACCOUNT_PAGE.format(cc=cc, schedule_id="0"))
+
+    def days(self, cc, sid, fid):
+        if not self.require_login():
+            return
+        with self.scenario.lock:
+            dates = sorted(self.scenario.facilities.get(fid, {}))
+        body = json.dumps([{"date": d, "business_day": True} for d in dates])
+        etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            return self.reply(304, "", "application/json", headers={"ETag": etag})
+        self.reply(200, body, "application/json", headers={"ETag": etag})
+
+    def times(self, cc, sid, fid):
+        if not self.require_login():
+            return
+        date = self.query.get("date", [""])[0]
+        with self.scenario.lock:
+            times = list(self.scenario.facilities.get(fid, {}).get(date, []))
+        self.reply(200, json.dumps({"available_times": times, "business_times": times}), "application/json")
+
+    def appointment_page(self, cc, sid):
+        if not self.require_login():
+            return
+        with self.scenario.lock:
+            token = self.scenario.new_token()
+        self.reply(200, APPOINTMENT_PAGE.format(cc=cc, schedule_id=sid, token=token))
+
+    def book(self, cc, sid):
+        if not self.require_login():
+            return
+        fid = self.form.get("appointments[consulate_appointment][facility_id]")
+        date = self.form.get("appointments[consulate_appointment][date]")
+        time_str = self.form.get("appointments[consulate_appointment][time]")
+        with self.scenario.lock:
+            token_ok = self.form.get("authenticity_token") in self.scenario.tokens
+            times = self.scenario.facilities.get(fid, {}).get(date, [])
+            ok = token_ok and time_str in times
+            if ok:
+                times.remove(time_str)
+                if not times:
+                    del self.scenario.facilities[fid][date]
+                released = self.scenario.released_at.get((fid, date))
+                self.scenario.bookings.append({
+                    "facility": fid, "date": date, "time": time_str,
+                    "latency": time.monotonic() - released if released else None,
+                })
+        if ok:
+            return self.reply(200, "<html><body>You have successfully scheduled your visa appointment. "
+                                   "Successfully Scheduled</body></html>")
+        self.reply(200, "<html><body>There was an error scheduling your appointment.</body></html>")
+
+
+def start_server(scenario, host="127.0.0.1", port=0):
+    # 在后台线程中启动，返回 (server, base_url)
+    handler = type("BoundMockAISHandler", (MockAISHandler,), {"scenario": scenario})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-ais", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 AIS 替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--scenario", help="场景 JSON 文件")
+    args = parser.parse_args()
+
+    scenario = Scenario.load(args.scenario) if args.scenario else Scenario({"95": {"2027-03-01": ["08:00"]}})
+    server, base_url = start_server(scenario, args.host, args.port)
+    print(f"Mock AIS 已启动: {base_url}")
+    try:
+        while True:
+            time.sleep(1)
+            scenario.advance()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"请求统计: {scenario.requests}")
+        print(f"预约记录: {scenario.bookings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# multi.py
+# 多申请人并发轮询：所有申请人共用一个 asyncio 事件循环，各自持有独立的会话状态
+#
+# config.ini 中每个申请人一个 [APPLICANT:<名字>] 小节，未填写的字段沿用 [USVISA] 中的值：
+#   [APPLICANT:alice]
+#   USERNAME = alice@example.com
+#   PASSWORD = ...
+#   SCHEDULE_ID = 12345678
+#   MY_SCHEDULE_DATE = 2026-10-01
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from ais_http import (
+    export_driver_session, fetch_json,
+    fetch_appointment_form, book_appointment,
+)
+from http_login import http_login
+from retry import Retrier, not_processed
+from date_rules import load_rules
+from log_setup import setup_logging
+from lean_browser import load_page
+from visa import (
+    config, logger, browser_pool, do_login_action, send_notification, close_services, get_cooldown,
+    rate_limiter, slot_policy, get_session_cache, MY_CONDITION,
+    BASE_URL, COUNTRY_CODE, EXCEPTION_TIME,
+)
+
+APPLICANT_PREFIX = "APPLICANT:"
+MAX_RETRY = 6
+
+
+class Applicant:
+    def __init__(self, name, section, base_url=BASE_URL):
+        self.name = name
+        self.base_url = base_url
+        self.username = section['USERNAME']
+        self.password = section['PASSWORD']
+        self.schedule_id = section['SCHEDULE_ID']
+        self.facility_id = section['FACILITY_ID']
+        # [RULES] 对所有申请人生效，“早于当前预约”按各自的 MY_SCHEDULE_DATE
+        self.rules = load_rules(config, section['MY_SCHEDULE_DATE'], condition=MY_CONDITION)
+
+        schedule_url = f"{base_url}/{COUNTRY_CODE}/niv/schedule/{self.schedule_id}"
+        self.schedule_url = schedule_url
+        self.date_url = f"{schedule_url}/appointment/days/{self.facility_id}.json?appointments[expedite]=false"
+        self.time_url = f"{schedule_url}/appointment/times/{self.facility_id}.json?date=%s&appointments[expedite]=false"
+        self.appointment_url = f"{schedule_url}/appointment"
+
+        self.session = None
+        self.retrier = Retrier(on_session_expired=self.login, limiter=rate_limiter)
+        # 缓存只按账号区分：指向其他站点（本地模拟服务器、基准测试）时不读写，避免混进正式的会话缓存
+        self.cache = get_session_cache() if base_url == BASE_URL else None
+        self.done = False
+        self.retry_count = 0
+
+    def login(self):
+        try:
+            self.session = http_login(self.base_url, COUNTRY_CODE, self.username, self.password, session=self.session)
+            self.save_session()
+            return
+        except Exception as e:
+            logger.warning(f"[{self.name}] HTTP 登录失败，回退到浏览器登录: {e}")
+
+        # 浏览器只用于登录，导出会话后立即关闭
+        drv = browser_pool.acquire()
+        try:
+            load_page(drv, f"{self.base_url}/{COUNTRY_CODE}/niv/users/sign_in")
+            do_login_action(drv, self.username, self.password)
+            self.session = export_driver_session(drv)
+        finally:
+            browser_pool.discard(drv)
+        self.save_session()
+
+    def save_session(self):
+        if self.cache is not None:
+            self.cache.save(self.username, self.session)
+
+    def resume(self):
+        # 与 visa.resume_session 相同：缓存的会话通过一次 days 请求验证后直接复用
+        cached = self.cache.load(self.username) if self.cache is not None else None
+        if cached is None:
+            return False
+        try:
+            fetch_json(cached, self.date_url, self.schedule_url, timeout=10)
+        except Exception as e:
+            logger.info(f"[{self.name}] 缓存的会话已失效，重新登录: {e}")
+            self.cache.discard(self.username)
+            return False
+        self.session = cached
+        logger.info(f"[{self.name}] 复用缓存的会话，跳过登录")
+        return True
+
+    def get_date(self):
+        # 重新登录后 self.session 可能换成新对象，每次尝试都重新取
+        return self.retrier.call("days", lambda: fetch_json(self.session, self.date_url, self.schedule_url))
+
+    def get_time(self, date):
+        data = self.retrier.call("times", lambda: fetch_json(self.session, self.time_url % date, self.schedule_url))
+        # 与 visa.py 相同的时间偏好（[BOOKING] PREFERRED_TIMES / TIME_ORDER）；没有可用时间时返回 None
+        times = slot_policy.order_times(data.get("available_times") or [])
+        return times[0] if times else None
+
+    def acceptable(self, dates):
+        # 接口返回的全部日期中满足规则的那些，保持原有顺序
+        accept = self.rules.compile()
+        return [item['date'] for item in dates if item.get('date') and accept(item['date'])]
+
+    def reschedule(self, date):
+        time_str = self.get_time(date)
+        if time_str is None:
+            return False, None
+        # 表单单独重试；提交只在确定没有被处理时重试（见 retry.py）
+        form = self.retrier.call("form", lambda: fetch_appointment_form(self.session, self.appointment_url))
+        try:
+            ok = self.retrier.call("book", lambda: book_appointment(
+                self.session, self.appointment_url, form, self.facility_id, date, time_str))
+        except Exception as e:
+            if not_processed(e):
+                raise
+            # 提交可能已经成功（同 visa.hold_uncertain）：之后只预约比它更早的日期；ok 为 None 表示结果不确定
+            logger.error(f"[{self.name}] 预约提交结果不确定: {date} {time_str}: {e}")
+            self.rules.before = min(self.rules.before, date)
+            return None, time_str
+        return ok, time_str
+
+
+def load_applicants():
+    defaults = config['USVISA']
+    applicants = []
+    for section_name in config.sections():
+        if not section_name.startswith(APPLICANT_PREFIX):
+            continue
+        section = config[section_name]
+        merged = {key: section.get(key, defaults.get(key))
+                  for key in ('USERNAME', 'PASSWORD', 'SCHEDULE_ID', 'FACILITY_ID', 'MY_SCHEDULE_DATE')}
+        applicants.append(Applicant(section_name[len(APPLICANT_PREFIX):].strip(), merged))
+    if not applicants:
+        applicants.append(Applicant(defaults['USERNAME'], defaults))
+    return applicants
+
+
+async def run_applicant(app):
+    while not app.done:
+        try:
+            if app.session is None and not await asyncio.to_thread(app.resume):
+                await asyncio.to_thread(app.login)
+            dates = await asyncio.to_thread(app.get_date)
+            app.retry_count = 0
+            acceptable = app.acceptable(dates)
+            if acceptable:
+                earliest = acceptable[0]
+                logger.info(f"[{app.name}] 找到比预期更早的预约时间: {earliest}")
+                ok, time_str = await asyncio.to_thread(app.reschedule, earliest)
+                if time_str is None:
+                    logger.warning(f"[{app.name}] {earliest} 没有可用的预约时间")
+                elif ok:
+                    app.done = True
+                    send_notification(f"[{app.name}] 预约修改成功: {earliest} {time_str}")
+                    break
+                elif ok is None:
+                    send_notification(f"[{app.name}] 预约提交结果不确定: {earliest} {time_str}，请登录确认当前预约；"
+                                      f"之后只尝试早于 {earliest} 的日期")
+                else:
+                    send_notification(f"[{app.name}] 预约修改失败: {earliest} {time_str}")
+            elif dates:
+                logger.info(f"[{app.name}] 暂无符合条件的更早预约时间，当前最早: {dates[0]['date']}")
+            else:
+                logger.warning(f"[{app.name}] 暂无可预约日期")
+            await asyncio.sleep(get_cooldown())
+
+        except Exception as e:
+            app.retry_count += 1
+            logger.error(f"[{app.name}] 轮询异常({app.retry_count}): {e}")
+            if app.retry_count > MAX_RETRY:
+                send_notification(f"HELP! [{app.name}] Crashed.")
+                break
+            await asyncio.sleep(EXCEPTION_TIME)
+
+
+async def main():
+    applicants = load_applicants()
+    logger.info(f"多申请人模式启动，共 {len(applicants)} 个申请人: {[a.name for a in applicants]}")
+    # 每个申请人同一时间只占用一个线程，避免默认线程池成为瓶颈
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=len(applicants) + 4))
+    await asyncio.gather(*(run_applicant(app) for app in applicants))
+    close_services()
+
+
+if __name__ == "__main__":
+    setup_logging(config)
+    asyncio.run(main())
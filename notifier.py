@@ -0,0 +1,162 @@
+# notifier.py
+# 后台通知分发：有界队列 + 单独的发送线程，轮询/预约线程只负责入队，不会被网络发送阻塞
+# 短时间内的多条消息合并成一条发送；渠道包括 SMTP 邮件、Pushover、SendGrid
+import time
+import queue
+import logging
+import threading
+
+import requests
+
+from sendmail import SMTPClient
+
+logger = logging.getLogger(__name__)
+
+PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+
+
+def is_configured(value):
+    # config.ini 里的占位符（全是 x）视为未配置
+    value = (value or "").strip()
+    return bool(value) and set(value.lower()) != {"x"}
+
+
+class EmailChannel:
+    name = "email"
+
+    def __init__(self, section=None):
+        self.client = SMTPClient(section)
+
+    def send(self, subject, messages):
+        self.client.send(subject, "<br>".join(messages))
+
+    def close(self):
+        self.client.close()
+
+
+class PushoverChannel:
+    name = "pushover"
+
+    def __init__(self, token, user, url=PUSHOVER_URL):
+        self.token = token
+        self.user = user
+        self.url = url
+        self.http = requests.Session()
+
+    def send(self, subject, messages):
+        r = self.http.post(self.url, data={
+            "token": self.token,
+            "user": self.user,
+            "title": subject,
+            "message": "\n".join(messages),
+        }, timeout=15)
+        r.raise_for_status()
+
+    def close(self):
+        self.http.close()
+
+
+class SendGridChannel:
+    name = "sendgrid"
+
+    def __init__(self, api_key, sender_email, receiver_email, url=SENDGRID_URL):
+        self.sender_email = sender_email
+        self.receiver_email = receiver_email
+        self.url = url
+        self.http = requests.Session()
+        self.http.headers["Authorization"] = f"Bearer {api_key}"
+
+    def send(self, subject, messages):
+        r = self.http.post(self.url, json={
+            "personalizations": [{"to": [{"email": self.receiver_email}]}],
+            "from": {"email": self.sender_email},
+            "subject": subject,
+            "content": [{"type": "text/html", "value": "<br>".join(messages)}],
+        }, timeout=15)
+        r.raise_for_status()
+
+    def close(self):
+        self.http.close()
+
+
+def build_channels(config):
+    channels = []
+    if config.has_section('EMAIL') and is_configured(config['EMAIL'].get('SENDER_EMAIL')):
+        channels.append(EmailChannel(config['EMAIL']))
+    if config.has_section('PUSHOVER'):
+        push = config['PUSHOVER']
+        if is_configured(push.get('PUSH_TOKEN')) and is_configured(push.get('PUSH_USER')):
+            channels.append(PushoverChannel(push['PUSH_TOKEN'], push['PUSH_USER'],
+                                            push.get('PUSH_URL', PUSHOVER_URL)))
+    if config.has_section('SENDGRID') and config.has_section('EMAIL'):
+        grid = config['SENDGRID']
+        if is_configured(grid.get('SENDGRID_API_KEY')):
+            channels.append(SendGridChannel(grid['SENDGRID_API_KEY'],
+                                            config['EMAIL']['SENDER_EMAIL'],
+                                            config['EMAIL']['RECEIVER_EMAIL'],
+                                            grid.get('SENDGRID_URL', SENDGRID_URL)))
+    return channels
+
+
+class Notifier:
+    def __init__(self, channels, subject="Visa Appointment Notification", maxsize=100, coalesce_seconds=2.0):
+        self.channels = channels
+        self.subject = subject
+        self.coalesce_seconds = coalesce_seconds
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+
+    def notify(self, msg):
+        # 永不阻塞调用方；队列满时丢弃最旧的一条
+        while True:
+            try:
+                self._queue.put_nowait(msg)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                    logger.warning(f"通知队列已满，丢弃: {dropped}")
+                except queue.Empty:
+                    pass
+
+    def close(self, timeout=30):
+        # 退出前把队列里剩下的通知发完
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _collect(self, first):
+        # 在合并窗口内继续收取消息，一批只发送一次
+        messages = [first]
+        deadline = time.monotonic() + self.coalesce_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return messages, False
+            try:
+                msg = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return messages, False
+            if msg is None:
+                return messages, True
+            messages.append(msg)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            messages, stopping = self._collect(first)
+            self._dispatch(messages)
+        for channel in self.channels:
+            channel.close()
+
+    def _dispatch(self, messages):
+        for channel in self.channels:
+            try:
+                channel.send(self.subject, messages)
+                logger.info(f"通知已通过 {channel.name} 发送（{len(messages)} 条）")
+            except Exception as e:
+                logger.warning(f"通过 {channel.name} 发送通知失败: {e}")
@@ -0,0 +1,114 @@
+# rate_limit.py
+# 同一台机器上所有轮询进程共享的令牌桶限速器：状态保存在临时目录下的一个 JSON 文件中，通过 flock 互斥
+#   轮询请求（days）需要桶里至少留下 BOOKING_RESERVE 个令牌，并且在有预约请求等待时让路
+#   预约请求（times / 预约提交）只需要 1 个令牌
+#   收到 429 / 403 时所有进程一起降速（速率乘以 DECREASE）并暂停 Retry-After 或 PENALTY 秒，
+#   之后每次成功按 INCREASE 缓慢加速，直到 MAX_RATE（AIMD），总吞吐量停在站点可接受的上限附近
+import os
+import json
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+POLL, BOOK = "poll", "book"
+THROTTLE_STATUSES = (403, 429)
+
+
+class HostRateLimiter:
+    def __init__(self, path=None, rate=30.0, min_rate=6.0, max_rate=60.0, burst=5.0,
+                 booking_reserve=1.0, decrease=0.5, increase=0.2, penalty=60.0, booking_hold=5.0):
+        # 速率单位：次/分钟（全机器合计）
+        self.path = path or os.path.join(tempfile.gettempdir(), "visa_rate_limit.json")
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.booking_reserve = booking_reserve
+        self.decrease = decrease
+        self.increase = increase
+        self.penalty = penalty
+        self.booking_hold = booking_hold
+        # flock 只在进程之间互斥，同一进程内的线程另外用锁
+        self._lock = threading.Lock()
+
+    def _update(self, fn):
+        # 在锁内读出状态、调用 fn(state, now) 修改并写回，返回 fn 的结果
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                state.setdefault("rate", self.rate)
+                state.setdefault("tokens", self.burst)
+                state.setdefault("updated", now)
+                state.setdefault("blocked_until", 0.0)
+                state.setdefault("booking_until", 0.0)
+                elapsed = max(0.0, now - state["updated"])
+                state["tokens"] = min(self.burst, state["tokens"] + elapsed * state["rate"] / 60)
+                state["updated"] = now
+                result = fn(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _try_take(self, priority):
+        def take(state, now):
+            if now < state["blocked_until"]:
+                return state["blocked_until"] - now
+            if priority == BOOK:
+                state["booking_until"] = now + self.booking_hold
+                needed = 1.0
+            elif now < state["booking_until"]:
+                return state["booking_until"] - now
+            else:
+                needed = 1.0 + self.booking_reserve
+            if state["tokens"] >= needed:
+                state["tokens"] -= 1.0
+                if priority == BOOK:
+                    state["booking_until"] = 0.0
+                return 0.0
+            return (needed - state["tokens"]) * 60 / state["rate"]
+        return self._update(take)
+
+    def acquire(self, priority=POLL):
+        # 阻塞直到拿到一个令牌，返回等待的秒数
+        waited = 0.0
+        while True:
+            wait = self._try_take(priority)
+            if wait <= 0:
+                if waited >= 1:
+                    logger.info(f"主机限速：等待 {waited:.1f} 秒后放行 {priority} 请求")
+                return waited
+            wait = min(wait, 5.0) if priority == POLL else min(wait, 0.5)
+            time.sleep(wait)
+            waited += wait
+
+    def throttled(self, status, retry_after=0.0):
+        def slow_down(state, now):
+            state["rate"] = max(self.min_rate, state["rate"] * self.decrease)
+            state["tokens"] = 0.0
+            state["blocked_until"] = max(state["blocked_until"], now + max(retry_after, self.penalty))
+            return state["rate"]
+        rate = self._update(slow_down)
+        logger.warning(f"主机限速：收到 {status}，全部进程暂停 {max(retry_after, self.penalty):.0f} 秒，"
+                       f"速率降至 {rate:.1f} 次/分钟")
+
+    def succeeded(self):
+        def speed_up(state, now):
+            state["rate"] = min(self.max_rate, state["rate"] + self.increase)
+        self._update(speed_up)
+
+    def current_rate(self):
+        return self._update(lambda state, now: state["rate"])
@@ -0,0 +1,330 @@
+# recording.py
+# 录制与回放：把真实运行中 days / times / 预约表单 / 预约提交 的响应及其时间记录到一个 gzip 压缩的 JSONL 文件，
+# 之后在本地回放给轮询主循环，不需要账号和网络，用于比较不同版本的吞吐和决策延迟
+#
+# 文件格式（每行一个 JSON）：
+#   {"type": "meta", "version": 1, "started": 1760000000.0}
+#   {"type": "body", "id": 0, "text": "[{\"date\": ...}]"}               相同的响应正文只保存一次
+#   {"type": "exchange", "t": 12.345, "key": "days/95", "method": "GET", "status": 200,
+#    "headers": {"ETag": "..."}, "body": 0, "elapsed_ms": 85.2}
+# 不记录登录相关的请求，也不记录请求体（其中有密码）
+#
+# 回放: python recording.py replay run.jsonl.gz --port 8080 [--speed 0]，然后 BASE_URL = http://127.0.0.1:8080
+#   --speed 0  尽可能快：每个 days 请求依次拿到下一条录制的响应，全部用完后结束
+#   --speed N  按录制时的时间轴以 N 倍速回放
+# 登录、会话由 mock_ais 的逻辑处理；预约提交在服务器端计时（日期首次出现在响应中 -> 收到 POST）
+import re
+import json
+import gzip
+import time
+import queue
+import bisect
+import hashlib
+import logging
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer
+
+from mock_ais import Scenario, MockAISHandler
+
+logger = logging.getLogger(__name__)
+
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Retry-After")
+
+KEY_PATTERNS = [
+    ("GET", re.compile(r"/appointment/days/(?P<fid>\d+)\.json$"), "days/{fid}"),
+    ("GET", re.compile(r"/appointment/times/(?P<fid>\d+)\.json$"), "times/{fid}/{date}"),
+    ("GET", re.compile(r"/appointment$"), "appointment"),
+    ("POST", re.compile(r"/appointment$"), "book/{fid}/{date}"),
+]
+
+
+def exchange_key(method, url, form=None):
+    # 把请求归一成与账号、schedule id 无关的键，例如 days/95、times/95/2026-11-02
+    parsed = urlparse(url)
+    query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+    form = form or {}
+    for pattern_method, pattern, template in KEY_PATTERNS:
+        match = pattern.search(parsed.path)
+        if pattern_method == method and match:
+            return template.format(
+                fid=match.groupdict().get("fid") or form.get("appointments[consulate_appointment][facility_id]", ""),
+                date=query.get("date") or form.get("appointments[consulate_appointment][date]", ""),
+            )
+    return None
+
+
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.started = time.time()
+        self._queue = queue.Queue()
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._bodies = {}
+        self._write({"type": "meta", "version": 1, "started": self.started})
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"录制 HTTP 交互到 {path}")
+
+    def attach(self, session):
+        # 与 metrics.instrument_session 相同，通过 response hook 记录，不改动调用方
+        if getattr(session, "_recorder_attached", False):
+            return session
+        session.hooks["response"].append(self._on_response)
+        session._recorder_attached = True
+        return session
+
+    def _on_response(self, response, *args, **kwargs):
+        # hook 在 requests 读取正文之前调用：先在请求线程里读完正文（requests 随后本来也要读），
+        # 解析和压缩写入放到后台线程
+        response.content
+        self._queue.put((time.time(), response))
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=5)
+            except queue.Empty:
+                # 空闲时同步刷新压缩流，进程被直接杀掉时最多丢失几秒的记录
+                self._file.flush()
+                continue
+            if item is None:
+                break
+            try:
+                self._record(*item)
+            except Exception as e:
+                logger.warning(f"录制响应失败: {e}")
+        self._file.close()
+
+    def _record(self, received_at, response):
+        request = response.request
+        form = {}
+        if request.method == "POST" and isinstance(request.body, (str, bytes)):
+            body = request.body.decode() if isinstance(request.body, bytes) else request.body
+            form = {k: v[0] for k, v in parse_qs(body).items()}
+        key = exchange_key(request.method, request.url, form)
+        if key is None:
+            return
+        text = response.text
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        if digest not in self._bodies:
+            self._bodies[digest] = len(self._bodies)
+            self._write({"type": "body", "id": self._bodies[digest], "text": text})
+        self._write({
+            "type": "exchange",
+            "t": round(received_at - self.started, 4),
+            "key": key,
+            "method": request.method,
+            "status": response.status_code,
+            "headers": {h: response.headers[h] for h in RECORDED_HEADERS if h in response.headers},
+            "body": self._bodies[digest],
+            "elapsed_ms": round(response.elapsed.total_seconds() * 1000, 2),
+        })
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+
+def _complete_lines(f):
+    # 进程异常退出时文件末尾可能不完整，读到的完整行照常使用
+    try:
+        for line in f:
+            if line.endswith("\n"):
+                yield line
+    except EOFError:
+        logger.warning("录制文件末尾不完整，已忽略")
+
+
+def load_recording(path):
+    # 返回按时间排序的交互列表，正文已展开；304 替换为它所对应的上一条完整响应
+    bodies = {}
+    exchanges = []
+    last_full = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in _complete_lines(f):
+            record = json.loads(line)
+            if record["type"] == "body":
+                bodies[record["id"]] = record["text"]
+            elif record["type"] == "exchange":
+                record["text"] = bodies[record.pop("body")]
+                if record["status"] == 304 and record["key"] in last_full:
+                    full = last_full[record["key"]]
+                    record.update(status=full["status"], text=full["text"], headers=full["headers"])
+                elif record["status"] == 200:
+                    last_full[record["key"]] = record
+                exchanges.append(record)
+    exchanges.sort(key=lambda r: r["t"])
+    return exchanges
+
+
+class Replay:
+    def __init__(self, exchanges, speed=0.0):
+        self.speed = speed
+        self.by_key = {}
+        for record in exchanges:
+            self.by_key.setdefault(record["key"], []).append(record)
+        self.times = {key: [r["t"] for r in records] for key, records in self.by_key.items()}
+        self.cursors = {}
+        self.duration = exchanges[-1]["t"] if exchanges else 0.0
+        self.started = time.monotonic()
+        self.finished = threading.Event()
+        self.served = 0
+        self.lock = threading.Lock()
+
+    def pick(self, key):
+        # 选出这个键当前应回放的录制响应；没有录制时返回 None
+        records = self.by_key.get(key)
+        if not records:
+            return None
+        with self.lock:
+            if key.startswith("days/"):
+                self.served += 1
+            if self.speed > 0:
+                clock = (time.monotonic() - self.started) * self.speed
+                if clock >= self.duration:
+                    self.finished.set()
+                index = max(bisect.bisect_right(self.times[key], clock) - 1, 0)
+            else:
+                index = self.cursors.get(key, 0)
+                self.cursors[key] = index + 1
+                if key.startswith("days/") and all(
+                        self.cursors.get(k, 0) >= len(v) for k, v in self.by_key.items() if k.startswith("days/")):
+                    self.finished.set()
+                index = min(index, len(records) - 1)
+        return records[index]
+
+
+class ReplayHandler(MockAISHandler):
+    replay = None
+
+    def reply_recorded(self, record):
+        headers = {k: v for k, v in record["headers"].items() if k != "Content-Type"}
+        content_type = record["headers"].get("Content-Type", "application/json")
+        etag = headers.get("ETag")
+        if etag and record["status"] == 200 and self.headers.get("If-None-Match") == etag:
+            return self.reply(304, "", content_type, headers=headers)
+        self.reply(record["status"], record["text"], content_type, headers=headers)
+
+    def days(self, cc, sid, fid):
+        if not self.require_login():
+            return
+        record = self.replay.pick(f"days/{fid}")
+        if record is None:
+            return super().days(cc, sid, fid)
+        if record["status"] == 200:
+            self.track_released(fid, record["text"])
+        self.reply_recorded(record)
+
+    def track_released(self, fid, text):
+        # 日期第一次出现在回放的响应里时开始计时，预约 POST 时计算检测延迟
+        try:
+            dates = [d.get("date") for d in json.loads(text)]
+        except ValueError:
+            return
+        now = time.monotonic()
+        with self.scenario.lock:
+            known = self.scenario.facilities.setdefault(fid, {})
+            for date in dates:
+                if date and date not in known:
+                    known[date] = []
+                    self.scenario.released_at[(fid, date)] = now
+
+    def times(self, cc, sid, fid):
+        if not self.require_login():
+            return
+        date = self.query.get("date", [""])[0]
+        record = self.replay.pick(f"times/{fid}/{date}")
+        if record is None:
+            return self.reply(200, json.dumps({"available_times": ["08:00"], "business_times": ["08:00"]}),
+                              "application/json")
+        self.reply_recorded(record)
+
+    def book(self, cc, sid):
+        if not self.require_login():
+            return
+        fid = self.form.get("appointments[consulate_appointment][facility_id]")
+        date = self.form.get("appointments[consulate_appointment][date]")
+        with self.scenario.lock:
+            released = self.scenario.released_at.get((fid, date))
+            self.scenario.bookings.append({
+                "facility": fid, "date": date, "time": self.form.get("appointments[consulate_appointment][time]"),
+                "latency": time.monotonic() - released if released else None,
+            })
+        record = self.replay.pick(f"book/{fid}/{date}")
+        if record is None:
+            return self.reply(200, "<html><body>Successfully Scheduled</body></html>")
+        self.reply_recorded(record)
+
+
+def start_replay_server(replay, host="127.0.0.1", port=0, session_ttl=3600):
+    scenario = Scenario(session_ttl=session_ttl)
+    handler = type("BoundReplayHandler", (ReplayHandler,), {"scenario": scenario, "replay": replay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="replay", daemon=True).start()
+    return server, scenario, f"http://{host}:{server.server_port}"
+
+
+def summarize(exchanges):
+    counts = {}
+    for record in exchanges:
+        kind = record["key"].split("/", 1)[0]
+        counts[f"{kind} {record['status']}"] = counts.get(f"{kind} {record['status']}", 0) + 1
+    duration = exchanges[-1]["t"] if exchanges else 0.0
+    return duration, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 交互录制文件的查看与回放")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="查看录制文件概况")
+    info.add_argument("path")
+    replay_cmd = sub.add_parser("replay", help="启动回放服务器")
+    replay_cmd.add_argument("path")
+    replay_cmd.add_argument("--host", default="127.0.0.1")
+    replay_cmd.add_argument("--port", type=int, default=8080)
+    replay_cmd.add_argument("--speed", type=float, default=0.0, help="0 表示尽可能快，N 表示 N 倍速")
+    replay_cmd.add_argument("--linger", type=float, default=3.0, help="回放结束后继续服务的秒数（让进行中的预约完成）")
+    replay_cmd.add_argument("--json", help="回放结束后把结果写入 JSON 文件（可用 benchmark.py 的方式比较）")
+    args = parser.parse_args()
+
+    exchanges = load_recording(args.path)
+    duration, counts = summarize(exchanges)
+    print(f"录制时长 {duration:.0f} 秒，共 {len(exchanges)} 条交互: {counts}")
+    if args.command == "info":
+        return
+
+    replay = Replay(exchanges, args.speed)
+    server, scenario, base_url = start_replay_server(replay, args.host, args.port)
+    print(f"回放服务器已启动: {base_url}")
+    try:
+        while not replay.finished.wait(1):
+            pass
+        time.sleep(args.linger)
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    elapsed = time.monotonic() - replay.started
+    latencies = sorted(b["latency"] * 1000 for b in scenario.bookings if b["latency"] is not None)
+    results = {
+        "replay_seconds": elapsed,
+        "days_served": replay.served,
+        "polls_per_sec": replay.served / elapsed if elapsed else 0.0,
+        "bookings": len(scenario.bookings),
+        "detect_to_book_p50_ms": latencies[len(latencies) // 2] if latencies else 0.0,
+        "detect_to_book_max_ms": latencies[-1] if latencies else 0.0,
+    }
+    for key, value in results.items():
+        print(f"{key:28s} {value:12.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# retry.py
+# 请求重试与熔断：有上限的迭代重试 + 带抖动的指数退避 + 按接口划分的熔断器
+#   401 / session expired  重新登录后重试一次（不计入熔断）
+#   429                    按 Retry-After 或加倍退避，计入熔断
+#   5xx / 超时 / 连接错误   指数退避，计入熔断
+#   其他 4xx               直接抛出
+# 预约提交（book）不是幂等的：只有确定请求没有被站点处理（429、连接没建立起来）时才重试，
+# 读超时、连接中断、5xx 都可能已经提交成功，计入熔断后直接抛给调用方，由调用方决定是否继续
+# 熔断打开后在 reset_timeout 内直接抛出 CircuitOpen，之后放行一次探测请求，成功即恢复；
+# 探测请求以既不算成功也不算失败的方式结束（其他 4xx、解析错误等）时回到 open 重新计时，
+# 探测超过 reset_timeout 仍没有结果时再放行一个
+# 配置了主机限速器时，每次尝试前先取令牌（days 为轮询优先级，times / book 为预约优先级），
+# 429 / 403 与成功结果同时反馈给限速器
+import time
+import random
+import logging
+import threading
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from ais_http import SessionExpired
+from rate_limit import POLL, BOOK, THROTTLE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"接口 {endpoint} 熔断中，{retry_in:.0f} 秒后再试")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def not_processed(error):
+    # 请求肯定没有被站点处理：熔断拒绝、401、429、连接超时或连接没建立起来（拒绝连接、DNS 失败）
+    if isinstance(error, (CircuitOpen, SessionExpired)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code == 429
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, endpoint, failure_threshold=5, reset_timeout=30.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        # 返回 True 表示本次调用是放行的探测请求，调用方必须记录结果或 release_probe()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            now = time.monotonic()
+            since = self.probe_at if self.state == self.HALF_OPEN else self.opened_at
+            remaining = self.reset_timeout - (now - since)
+            if remaining <= 0:
+                self.state = self.HALF_OPEN
+                self.probe_at = now
+                return True
+            raise CircuitOpen(self.endpoint, remaining)
+
+    def release_probe(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"接口 {self.endpoint} 已恢复，关闭熔断")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"接口 {self.endpoint} 连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f} 秒")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+def retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except ValueError:
+        return 0.0
+
+
+class Retrier:
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30.0,
+                 failure_threshold=5, reset_timeout=30.0, on_session_expired=None, limiter=None,
+                 non_idempotent=("book",)):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_session_expired = on_session_expired
+        self.limiter = limiter
+        self.non_idempotent = set(non_idempotent)
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint):
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+            return self._breakers[endpoint]
+
+    def backoff(self, attempt):
+        # full jitter：在 [0, min(max_delay, base * 2^n)] 中均匀取值
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, endpoint, fn, *args, relogin=True):
+        breaker = self.breaker(endpoint)
+        idempotent = endpoint not in self.non_idempotent
+        relogged = False
+        attempt = 0
+        probe = False
+        try:
+            while True:
+                if not probe:
+                    probe = breaker.before_call()
+                attempt += 1
+                if self.limiter is not None:
+                    self.limiter.acquire(POLL if endpoint == "days" else BOOK)
+                try:
+                    result = fn(*args)
+                except SessionExpired:
+                    # 会话过期不是站点故障，不计入熔断；每次调用最多重新登录一次，重试时仍占用探测名额
+                    if not relogin or relogged or self.on_session_expired is None:
+                        raise
+                    logger.warning("Session expired or unauthorized (401)，重新登录中...")
+                    self.on_session_expired()
+                    relogged = True
+                    attempt -= 1
+                    continue
+                except requests.exceptions.HTTPError as e:
+                    status = e.response.status_code if e.response is not None else None
+                    if self.limiter is not None and status in THROTTLE_STATUSES:
+                        self.limiter.throttled(status, retry_after(e.response))
+                    if status == 429:
+                        delay = max(retry_after(e.response), self.backoff(attempt + 1))
+                    elif status is not None and status >= 500:
+                        delay = self.backoff(attempt)
+                    else:
+                        raise
+                    breaker.record_failure()
+                    probe = False
+                    error = e
+                except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                    breaker.record_failure()
+                    probe = False
+                    delay = self.backoff(attempt)
+                    error = e
+                else:
+                    breaker.record_success()
+                    probe = False
+                    if self.limiter is not None:
+                        self.limiter.succeeded()
+                    return result
+
+                if not idempotent and not not_processed(error):
+                    # 站点可能已经处理了这次提交，重试会重复提交
+                    raise error
+                if attempt >= self.max_attempts:
+                    raise error
+                logger.warning(f"请求 {endpoint} 失败（第 {attempt} 次）: {error}，{delay:.1f} 秒后重试")
+                time.sleep(delay)
+        finally:
+            if probe:
+                # 探测请求没有得出结论（其他 4xx、SessionExpired、解析错误……），不能一直占着半开状态
+                breaker.release_probe()
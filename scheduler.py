@@ -0,0 +1,114 @@
+# scheduler.py
+# 自适应轮询节奏：记录更早日期真正出现的时间，按 星期 x 小时（168 个时段）估计放号概率，
+# 在总请求预算不变的前提下，把请求集中到放号概率高的时段，其余时段放慢
+# 预算按 days 请求计：每轮轮询 requests_per_poll 个使馆就算 requests_per_poll 个请求
+import os
+import json
+import time
+import random
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = 7 * 24
+SAVE_INTERVAL = 300
+
+
+def bucket_of(ts):
+    dt = datetime.fromtimestamp(ts)
+    return dt.weekday() * 24 + dt.hour
+
+
+class AdaptiveScheduler:
+    def __init__(self, state_file, budget_per_hour=900, min_interval=2.0, max_interval=60.0,
+                 prior_releases=1.0, prior_hours=24.0, jitter=0.2, requests_per_poll=1):
+        self.state_file = state_file
+        self.budget_per_hour = budget_per_hour
+        self.requests_per_poll = requests_per_poll
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # 先验：每个时段都当作已经观察了 prior_hours 小时、出现过 prior_releases 次，没有数据时节奏均匀
+        self.prior_releases = prior_releases
+        self.prior_hours = prior_hours
+        self.jitter = jitter
+        self.releases = [0] * BUCKETS
+        self.observed_seconds = [0.0] * BUCKETS
+        self._last_poll = None
+        self._last_save = time.time()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                state = json.load(f)
+            if len(state['releases']) == BUCKETS and len(state['observed_seconds']) == BUCKETS:
+                self.releases = state['releases']
+                self.observed_seconds = state['observed_seconds']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取轮询节奏模型失败，使用均匀节奏: {e}")
+
+    def save(self):
+        tmp = self.state_file + ".tmp"
+        with self._lock:
+            state = {'releases': list(self.releases), 'observed_seconds': list(self.observed_seconds)}
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_file)
+        self._last_save = time.time()
+
+    def record_poll(self, now=None):
+        # 两次轮询之间的时间计入当前时段的观察时长（上限 max_interval，停机期间不算）
+        now = now or time.time()
+        with self._lock:
+            if self._last_poll is not None:
+                self.observed_seconds[bucket_of(now)] += min(now - self._last_poll, self.max_interval)
+            self._last_poll = now
+        if now - self._last_save > SAVE_INTERVAL:
+            self.save()
+
+    def record_release(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            self.releases[bucket_of(now)] += 1
+        logger.info(f"记录放号事件: 星期{datetime.fromtimestamp(now).weekday() + 1} {datetime.fromtimestamp(now).hour} 点")
+        self.save()
+
+    def release_rates(self):
+        # 每个时段每小时的放号次数估计
+        with self._lock:
+            return [
+                (self.releases[b] + self.prior_releases) / (self.observed_seconds[b] / 3600 + self.prior_hours)
+                for b in range(BUCKETS)
+            ]
+
+    def allocation(self):
+        # 每个时段每小时分到的请求数，按放号概率分配；轮询间隔被 min_interval / max_interval 夹住的时段
+        # 固定在边界上，多用或省下的预算在其余时段之间重新分配，整周平均仍是 budget_per_hour
+        rates = self.release_rates()
+        low = 3600 * self.requests_per_poll / self.max_interval
+        high = 3600 * self.requests_per_poll / self.min_interval
+        fixed = {}
+        while len(fixed) < BUCKETS:
+            free = [b for b in range(BUCKETS) if b not in fixed]
+            remaining = max(0.0, self.budget_per_hour * BUCKETS - sum(fixed.values()))
+            weight = sum(rates[b] for b in free)
+            share = {b: remaining * rates[b] / weight for b in free}
+            clamped = {b: min(high, max(low, v)) for b, v in share.items() if not low <= v <= high}
+            if not clamped:
+                fixed.update(share)
+                break
+            fixed.update(clamped)
+        return [fixed[b] for b in range(BUCKETS)]
+
+    def interval_for(self, bucket):
+        per_hour = self.allocation()[bucket]
+        return min(self.max_interval, max(self.min_interval, 3600 * self.requests_per_poll / per_hour))
+
+    def next_interval(self, now=None):
+        interval = self.interval_for(bucket_of(now or time.time()))
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
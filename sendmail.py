@@ -2,35 +2,70 @@
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-import configparser
 
-# 加载配置
-config = configparser.ConfigParser()
-config.read('config.ini')
+from settings import load_config
 
-def send_email(subject, html_content):
-    sender_email = config['EMAIL']['SENDER_EMAIL']
-    sender_password = config['EMAIL']['SENDER_PASSWORD']
-    receiver_email = config['EMAIL']['RECEIVER_EMAIL']
-    smtp_server = config['EMAIL'].get('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(config['EMAIL'].get('SMTP_PORT', 587))
-
-    # 构建邮件内容
+def build_message(subject, html_content, sender_email, receiver_email):
     msg = MIMEMultipart("alternative")
     msg["Subject"] = subject
     msg["From"] = sender_email
     msg["To"] = receiver_email
     msg.attach(MIMEText(html_content, "html"))
+    return msg
+
+
+class SMTPClient:
+    # 复用一个已认证的 SMTP 连接，连接被服务器关闭时自动重连一次
+    def __init__(self, section=None):
+        section = section if section is not None else load_config()['EMAIL']
+        self.sender_email = section['SENDER_EMAIL']
+        self.sender_password = section['SENDER_PASSWORD']
+        self.receiver_email = section['RECEIVER_EMAIL']
+        self.smtp_server = section.get('SMTP_SERVER', 'smtp.gmail.com')
+        self.smtp_port = int(section.get('SMTP_PORT', 587))
+        # 本地测试用的 SMTP 替身通常不支持 STARTTLS
+        self.starttls = section.get('SMTP_STARTTLS', 'True').lower() in ('1', 'true', 'yes', 'on')
+        self.server = None
+
+    def connect(self):
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.sender_password:
+            server.login(self.sender_email, self.sender_password)
+        self.server = server
 
+    def send(self, subject, html_content):
+        msg = build_message(subject, html_content, self.sender_email, self.receiver_email)
+        for attempt in range(2):
+            if self.server is None:
+                self.connect()
+            try:
+                self.server.sendmail(self.sender_email, self.receiver_email, msg.as_string())
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self.server = None
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+
+def send_email(subject, html_content):
+    client = SMTPClient()
     try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
-        server.quit()
+        client.send(subject, html_content)
         print("✅ 邮件发送成功")
     except Exception as e:
         print(f"❌ 邮件发送失败: {e}")
+    finally:
+        client.close()
 
 
 # 测试用例（可注释掉）
@@ -0,0 +1,127 @@
+# session_cache.py
+# 加密的会话缓存：登录成功后把 cookie 和 User-Agent 加密保存到本地（每个账号一个文件），
+# 进程重启时先用一次 days 请求验证缓存的会话，仍然有效就直接复用，省掉一次完整登录
+#
+# 加密使用 cryptography 的 Fernet（AES-CBC + HMAC）。密钥优先取环境变量 VISA_SESSION_KEY，
+# 否则第一次保存时生成并保存到权限为 0600 的 key 文件。未安装 cryptography 时缓存不启用
+# 目录、密钥和 cryptography 都在第一次保存/读取时才处理，创建 SessionCache 本身没有副作用
+import os
+import json
+import time
+import hashlib
+import logging
+
+from ais_http import new_session
+
+logger = logging.getLogger(__name__)
+
+KEY_ENV = "VISA_SESSION_KEY"
+
+
+def _write_private(path, data):
+    # 先写临时文件再替换，权限始终是 0600
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def dump_cookies(session):
+    return [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+         "expires": c.expires, "secure": c.secure}
+        for c in session.cookies
+    ]
+
+
+class SessionCache:
+    def __init__(self, directory, key_file=None, max_age=3600):
+        self.directory = directory
+        self.key_file = key_file or os.path.join(directory, "session_cache.key")
+        self.max_age = max_age
+        self._fernet = None
+        self._unavailable = False
+
+    def _get_fernet(self, create):
+        # create=False 时没有密钥就返回 None（只读取，不在磁盘上留下任何东西）
+        if self._fernet is not None or self._unavailable:
+            return self._fernet
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            logger.warning("未安装 cryptography，会话缓存不启用（pip install cryptography）")
+            self._unavailable = True
+            return None
+        key = os.environ.get(KEY_ENV)
+        if not key:
+            if os.path.exists(self.key_file):
+                with open(self.key_file, "rb") as f:
+                    key = f.read().strip()
+            elif create:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                key = Fernet.generate_key()
+                _write_private(self.key_file, key)
+                logger.info(f"已生成会话缓存密钥: {self.key_file}")
+            else:
+                return None
+        self._fernet = Fernet(key)
+        return self._fernet
+
+    def _path(self, account):
+        # 文件名不暴露账号
+        return os.path.join(self.directory, hashlib.sha256(account.encode()).hexdigest()[:16] + ".session")
+
+    def save(self, account, session):
+        try:
+            fernet = self._get_fernet(create=True)
+            if fernet is None:
+                return
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"保存会话缓存失败: {e}")
+            return
+        data = {
+            "saved_at": time.time(),
+            "user_agent": session.headers.get("User-Agent"),
+            "cookies": dump_cookies(session),
+        }
+        try:
+            _write_private(self._path(account), fernet.encrypt(json.dumps(data).encode()))
+        except OSError as e:
+            logger.warning(f"保存会话缓存失败: {e}")
+
+    def load(self, account):
+        # 返回恢复的 requests.Session；不存在、过旧、cookie 已过期或无法解密时返回 None
+        fernet = self._get_fernet(create=False)
+        if fernet is None:
+            return None
+        path = self._path(account)
+        try:
+            with open(path, "rb") as f:
+                token = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            data = json.loads(fernet.decrypt(token, ttl=int(self.max_age)))
+        except Exception as e:
+            logger.info(f"会话缓存不可用（过旧或无法解密）: {type(e).__name__}")
+            self.discard(account)
+            return None
+        now = time.time()
+        cookies = [c for c in data["cookies"] if not c.get("expires") or c["expires"] > now]
+        if not cookies:
+            self.discard(account)
+            return None
+        session = new_session(data.get("user_agent"))
+        for c in cookies:
+            session.cookies.set(c["name"], c["value"], domain=c["domain"], path=c["path"],
+                                expires=c.get("expires"), secure=c.get("secure", False))
+        logger.info(f"已读取 {now - data['saved_at']:.0f} 秒前保存的会话缓存")
+        return session
+
+    def discard(self, account):
+        try:
+            os.remove(self._path(account))
+        except OSError:
+            pass
@@ -0,0 +1,102 @@
+# session_keeper.py
+# 会话保活：记录当前会话的年龄和 cookie 过期时间，学习会话的典型寿命，
+# 在预计过期之前于后台并行完成一次新登录，再原子地替换掉旧会话，轮询线程看不到中断
+#
+# 寿命估计：每次真正过期时按 EWMA 向观察值收敛；主动刷新成功（没见到过期）时把估计值略微上调，
+# 但不超过实际观察到的最长寿命（还没观察到过期时不超过配置值），避免估计值一路涨到必须真的过期一次
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = "_yatri_session"
+
+
+def cookie_expires_in(session, name=SESSION_COOKIE, now=None):
+    # 会话 cookie 带过期时间时返回剩余秒数，否则返回 None
+    now = now or time.time()
+    expires = [c.expires for c in session.cookies if c.name == name and c.expires]
+    return min(expires) - now if expires else None
+
+
+class SessionKeeper:
+    def __init__(self, renew, lifetime=1800.0, margin=0.8, alpha=0.3, explore=1.05,
+                 min_lifetime=120.0, check_interval=5.0):
+        # renew(): 在后台完成新登录并替换当前会话；失败时抛出异常
+        self.renew = renew
+        self.lifetime = lifetime
+        self.max_lifetime = lifetime
+        self._observed = False
+        self.margin = margin
+        self.alpha = alpha
+        self.explore = explore
+        self.min_lifetime = min_lifetime
+        self.check_interval = check_interval
+        self.session = None
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def session_started(self, session=None):
+        with self._lock:
+            self.session = session
+            self.started_at = time.monotonic()
+
+    def session_expired(self):
+        # 轮询发现会话过期：用实际寿命更新估计
+        with self._lock:
+            if self.started_at is None:
+                return
+            observed = time.monotonic() - self.started_at
+            self.started_at = None
+            if observed < self.min_lifetime:
+                return
+            self.max_lifetime = max(self.max_lifetime, observed) if self._observed else observed
+            self._observed = True
+            self.lifetime = min(self.alpha * observed + (1 - self.alpha) * self.lifetime, self.max_lifetime)
+        logger.info(f"会话在 {observed:.0f} 秒后过期，估计寿命更新为 {self.lifetime:.0f} 秒")
+
+    def age(self):
+        with self._lock:
+            return None if self.started_at is None else time.monotonic() - self.started_at
+
+    def refresh_due(self):
+        age = self.age()
+        if age is None:
+            return False
+        if age >= self.lifetime * self.margin:
+            return True
+        remaining = cookie_expires_in(self.session) if self.session is not None else None
+        return remaining is not None and remaining <= self.lifetime * (1 - self.margin)
+
+    def refresh(self):
+        age = self.age()
+        logger.info(f"会话已使用 {age:.0f} 秒（估计寿命 {self.lifetime:.0f} 秒），后台提前重新登录")
+        started = time.monotonic()
+        self.renew()
+        with self._lock:
+            self.lifetime = min(self.lifetime * self.explore, self.max_lifetime)
+        logger.info(f"会话已无缝替换，登录耗时 {time.monotonic() - started:.1f} 秒")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-keeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            if not self.refresh_due():
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                # 失败时等一会儿再试；旧会话仍然可用，过期后由轮询线程的重新登录兜底
+                logger.warning(f"后台刷新会话失败: {e}")
+                self._stop.wait(self.check_interval * 6)
@@ -0,0 +1,59 @@
+# settings.py
+# 配置只解析一次：load_config() 读取 config.ini 并缓存（路径可用环境变量 VISA_CONFIG 指定），
+# 账号和浏览器相关的核心配置再转换成一个类型明确的 Settings 对象，其余可选小节仍按需用 fallback 读取
+import os
+import configparser
+from collections import namedtuple
+from datetime import date
+
+from facilities import parse_facility_ids, parse_facility_weights
+
+DEFAULT_BASE_URL = "https://ais.usvisa-info.com"
+
+Settings = namedtuple("Settings", [
+    "username", "password", "schedule_id",
+    "my_schedule_date",     # ISO 格式字符串（已校验），与接口返回的日期直接按字符串比较
+    "country_code", "facility_id",
+    "facility_ids",         # [str]
+    "facility_weights",     # {str: int}，单位天
+    "base_url", "login_backend",
+    "local_use", "hub_address", "browserless",
+])
+
+_config = None
+
+
+def config_path():
+    return os.environ.get("VISA_CONFIG", "config.ini")
+
+
+def load_config(path=None):
+    global _config
+    if _config is None or path is not None:
+        config = configparser.ConfigParser()
+        path = path or config_path()
+        if not config.read(path, encoding="utf-8"):
+            raise FileNotFoundError(f"找不到配置文件: {path}")
+        _config = config
+    return _config
+
+
+def load_settings(config=None):
+    config = config or load_config()
+    usvisa = config['USVISA']
+    facility_id = usvisa['FACILITY_ID']
+    return Settings(
+        username=usvisa['USERNAME'],
+        password=usvisa['PASSWORD'],
+        schedule_id=usvisa['SCHEDULE_ID'],
+        my_schedule_date=date.fromisoformat(usvisa['MY_SCHEDULE_DATE']).isoformat(),
+        country_code=usvisa['COUNTRY_CODE'],
+        facility_id=facility_id,
+        facility_ids=parse_facility_ids(usvisa.get('FACILITY_IDS'), facility_id),
+        facility_weights=parse_facility_weights(usvisa.get('FACILITY_WEIGHTS')),
+        base_url=usvisa.get('BASE_URL', DEFAULT_BASE_URL).rstrip('/'),
+        login_backend=usvisa.get('LOGIN_BACKEND', 'selenium').lower(),
+        local_use=config.getboolean('CHROMEDRIVER', 'LOCAL_USE', fallback=False),
+        hub_address=config.get('CHROMEDRIVER', 'HUB_ADDRESS', fallback=''),
+        browserless=config.getboolean('CHROMEDRIVER', 'BROWSERLESS', fallback=False),
+    )
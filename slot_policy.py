@@ -0,0 +1,76 @@
+# slot_policy.py
+# 预约时间段选择：发现可接受的日期后并发查询前 N 个日期的 times，把 (日期, 时间) 按策略排成一个列表，
+# 提交失败时直接尝试下一个，不回到轮询
+#
+# [BOOKING]
+# TOP_DATES = 3                          并发查询 times 的候选日期数
+# MAX_ATTEMPTS = 4                       每次发现最多连续提交几个 (日期, 时间)
+# PREFERRED_TIMES = 08:00-11:30, 14:00-16:00
+# TIME_ORDER = latest                    偏好时段内（以及时段外）按 earliest / latest 排序
+# POLICY = date_first                    date_first：先按日期再按时间偏好；time_first：偏好时段内的时间优先于更早的日期
+from collections import namedtuple
+
+Slot = namedtuple("Slot", ["date", "facility_id", "time"])
+
+DATE_FIRST, TIME_FIRST = "date_first", "time_first"
+
+
+def normalize_time(time_str):
+    # "8:00" -> "08:00"：补齐成 HH:MM 之后才能按字符串比较和切片
+    return time_str.strip().zfill(5)
+
+
+def parse_time_windows(value):
+    # "08:00-11:30, 14:00-16:00" -> [("08:00", "11:30"), ("14:00", "16:00")]；HH:MM 字符串可直接比较
+    windows = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        start, end = (normalize_time(part) for part in item.split("-", 1))
+        windows.append((start, end))
+    return windows
+
+
+class SlotPolicy:
+    def __init__(self, preferred_times=(), time_order="latest", policy=DATE_FIRST):
+        self.preferred_times = list(preferred_times)
+        # 不配置时保持原来的行为：取当天最晚的时间
+        self.latest_first = time_order.lower() != "earliest"
+        self.policy = policy.lower()
+
+    def preferred(self, time_str):
+        if not self.preferred_times:
+            return True
+        time_str = normalize_time(time_str)
+        return any(start <= time_str <= end for start, end in self.preferred_times)
+
+    def _time_key(self, time_str):
+        time_str = normalize_time(time_str)
+        minutes = int(time_str[:2]) * 60 + int(time_str[3:5]) if ":" in time_str else 0
+        return (0 if self.preferred(time_str) else 1, -minutes if self.latest_first else minutes)
+
+    def order_times(self, times):
+        return sorted(times, key=self._time_key)
+
+    def rank(self, candidates, times):
+        # candidates: 已排好序的 [(date, facility_id), ...]；times: {(date, facility_id): [time, ...]}
+        slots = []
+        for rank, (date, facility_id) in enumerate(candidates):
+            for time_str in times.get((date, facility_id)) or []:
+                preferred, within_day = self._time_key(time_str)
+                if self.policy == TIME_FIRST:
+                    key = (preferred, rank, within_day)
+                else:
+                    key = (rank, preferred, within_day)
+                slots.append((key, Slot(date, facility_id, time_str)))
+        slots.sort(key=lambda item: item[0])
+        return [slot for _, slot in slots]
+
+
+def load_policy(config, section='BOOKING'):
+    return SlotPolicy(
+        parse_time_windows(config.get(section, 'PREFERRED_TIMES', fallback='')),
+        time_order=config.get(section, 'TIME_ORDER', fallback='latest'),
+        policy=config.get(section, 'POLICY', fallback=DATE_FIRST),
+    )
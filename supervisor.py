@@ -0,0 +1,226 @@
+# supervisor.py
+# 进程监管：每个轮询 worker 是一个子进程（python cli.py --config X poll），通过心跳文件检查健康状况，
+# 崩溃或卡住（心跳超时）的 worker 按指数退避重启；worker 把最近看到的日期、预约结果等写入检查点，
+# 新启动的 worker 读取检查点后直接接着上一个的状态运行（会话本身由 session_cache 恢复）
+#
+# [SUPERVISOR]
+# WORKERS =
+#     main: poll config.ini
+#     alice: poll alice.ini
+# STATE_DIR = state
+# HEARTBEAT_TIMEOUT = 180      超过该秒数没有心跳视为卡住
+# RESTART_BACKOFF = 5          第一次重启前等待的秒数，之后每次加倍
+# MAX_BACKOFF = 300
+# STABLE_SECONDS = 600         连续运行超过该时间后退避重新从 RESTART_BACKOFF 开始
+#
+# worker 退出码 0 表示已预约成功，不再重启
+# 只支持 poll / dry-run：心跳和检查点由 visa.main 写入，其他子命令（multi、book 等）没有心跳，会被反复重启
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_ENV = "VISA_HEARTBEAT"
+CHECKPOINT_ENV = "VISA_CHECKPOINT"
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+SUPERVISED_COMMANDS = ("poll", "dry-run")
+
+
+class WorkerState:
+    # worker 侧：写心跳、读写检查点
+    def __init__(self, heartbeat_path, checkpoint_path):
+        self.heartbeat_path = heartbeat_path
+        self.checkpoint_path = checkpoint_path
+        self._state = None
+
+    @classmethod
+    def from_env(cls):
+        # 由 supervisor 启动时才有这两个环境变量，单独运行时返回 None
+        heartbeat, checkpoint = os.environ.get(HEARTBEAT_ENV), os.environ.get(CHECKPOINT_ENV)
+        if not heartbeat or not checkpoint:
+            return None
+        return cls(heartbeat, checkpoint)
+
+    def beat(self):
+        with open(self.heartbeat_path, "w") as f:
+            f.write(str(time.time()))
+
+    def load(self):
+        if self._state is None:
+            try:
+                with open(self.checkpoint_path, encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._state = {}
+        return dict(self._state)
+
+    def save(self, **fields):
+        state = self.load()
+        state.update(fields, updated_at=time.time(), pid=os.getpid())
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.checkpoint_path)
+        self._state = state
+
+
+class Worker:
+    def __init__(self, name, command, config_path, state_dir):
+        self.name = name
+        self.command = command
+        self.config_path = config_path
+        self.heartbeat_path = os.path.join(state_dir, f"{name}.heartbeat")
+        self.checkpoint_path = os.path.join(state_dir, f"{name}.checkpoint.json")
+        self.proc = None
+        self.started_at = 0.0
+        self.next_start = 0.0
+        self.backoff = 0.0
+        self.restarts = 0
+        self.done = False
+
+    def start(self):
+        # 启动时先写一次心跳，给登录留出时间
+        with open(self.heartbeat_path, "w") as f:
+            f.write(str(time.time()))
+        env = dict(os.environ, **{HEARTBEAT_ENV: self.heartbeat_path, CHECKPOINT_ENV: self.checkpoint_path})
+        self.proc = subprocess.Popen([sys.executable, CLI, "--config", self.config_path, self.command], env=env)
+        self.started_at = time.monotonic()
+        logger.info(f"worker {self.name} 已启动 (pid {self.proc.pid})")
+
+    def heartbeat_age(self):
+        try:
+            return time.time() - os.path.getmtime(self.heartbeat_path)
+        except OSError:
+            return float("inf")
+
+    def stop(self, timeout=10):
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+
+def parse_workers(value, default_config):
+    # "name: command config" 每行一个；command 省略时为 poll，config 省略时用 supervisor 自己的配置文件
+    workers = []
+    for line in (value or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        name, _, rest = line.partition(":")
+        parts = rest.split()
+        command = parts[0] if parts else "poll"
+        if command not in SUPERVISED_COMMANDS:
+            raise ValueError(f"worker {name.strip()}: 不支持的子命令 {command}，只能是 {', '.join(SUPERVISED_COMMANDS)}")
+        workers.append((name.strip(), command, parts[1] if len(parts) > 1 else default_config))
+    return workers or [("main", "poll", default_config)]
+
+
+class Supervisor:
+    def __init__(self, workers, heartbeat_timeout=180, restart_backoff=5, max_backoff=300,
+                 stable_seconds=600, notify=None):
+        self.workers = workers
+        self.heartbeat_timeout = heartbeat_timeout
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.stable_seconds = stable_seconds
+        self.notify = notify
+        self._stopping = False
+
+    def schedule_restart(self, worker, reason):
+        now = time.monotonic()
+        if now - worker.started_at >= self.stable_seconds:
+            worker.backoff = 0.0
+        worker.backoff = min(self.max_backoff, worker.backoff * 2 if worker.backoff else self.restart_backoff)
+        worker.next_start = now + worker.backoff
+        worker.restarts += 1
+        worker.proc = None
+        logger.warning(f"worker {worker.name} {reason}，{worker.backoff:.0f} 秒后第 {worker.restarts} 次重启")
+        if self.notify is not None and worker.restarts % 5 == 0:
+            self.notify(f"worker {worker.name} 已重启 {worker.restarts} 次，最近一次: {reason}")
+
+    def check(self, worker):
+        now = time.monotonic()
+        if worker.proc is None:
+            if now >= worker.next_start:
+                worker.start()
+            return
+        code = worker.proc.poll()
+        if code == 0:
+            logger.info(f"worker {worker.name} 已完成预约，不再重启")
+            worker.done = True
+            worker.proc = None
+        elif code is not None:
+            self.schedule_restart(worker, f"退出 (code {code})")
+        else:
+            age = worker.heartbeat_age()
+            if age > self.heartbeat_timeout:
+                worker.stop()
+                self.schedule_restart(worker, f"{age:.0f} 秒没有心跳，已终止")
+
+    def run(self, interval=1.0):
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        try:
+            while not self._stopping and not all(w.done for w in self.workers):
+                for worker in self.workers:
+                    if not worker.done:
+                        self.check(worker)
+                time.sleep(interval)
+        finally:
+            for worker in self.workers:
+                worker.stop()
+        logger.info("supervisor 退出")
+
+    def _on_signal(self, signum, frame):
+        logger.info(f"收到信号 {signum}，停止所有 worker")
+        self._stopping = True
+
+
+def main(argv=None):
+    from settings import load_config, config_path
+    from log_setup import setup_logging
+
+    parser = argparse.ArgumentParser(description="轮询 worker 的进程监管")
+    parser.add_argument("--config", default=None)
+    args = parser.parse_args(argv)
+    if args.config:
+        os.environ["VISA_CONFIG"] = args.config
+
+    config = load_config()
+    setup_logging(config)
+    section = 'SUPERVISOR'
+    state_dir = config.get(section, 'STATE_DIR', fallback='state')
+    os.makedirs(state_dir, exist_ok=True)
+    workers = [Worker(name, command, path, state_dir)
+               for name, command, path in parse_workers(config.get(section, 'WORKERS', fallback=''), config_path())]
+
+    from notifier import Notifier, build_channels
+    notifier = Notifier(build_channels(config), subject="Visa supervisor")
+    supervisor = Supervisor(
+        workers,
+        heartbeat_timeout=config.getfloat(section, 'HEARTBEAT_TIMEOUT', fallback=180),
+        restart_backoff=config.getfloat(section, 'RESTART_BACKOFF', fallback=5),
+        max_backoff=config.getfloat(section, 'MAX_BACKOFF', fallback=300),
+        stable_seconds=config.getfloat(section, 'STABLE_SECONDS', fallback=600),
+        notify=notifier.notify,
+    )
+    logger.info(f"supervisor 启动，worker: {[w.name for w in workers]}")
+    try:
+        supervisor.run()
+    finally:
+        notifier.close()
+
+
+if __name__ == "__main__":
+    main()
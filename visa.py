@@ -1,60 +1,85 @@
 # -*- coding: utf8 -*-
 
-import os
+import sys
 import time
-import json
 import random
-import platform
 import logging
-import configparser
 from datetime import datetime
-import random
 
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait as Wait
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 import tempfile
-from sendmail import send_email
-
-# 日志配置
-log_dir = '/root/deploy/logs'
-os.makedirs(log_dir, exist_ok=True)
-log_path = os.path.join(log_dir, 'visa.log')
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler(log_path, mode='a', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+import atexit
+import threading
+from notifier import Notifier, build_channels
+from ais_http import (
+    SessionExpired, export_driver_session, sync_cookies, ajax_headers, is_session_expired, fetch_json,
+    fetch_appointment_form, book_appointment,
+)
+from http_login import http_login
+from concurrent.futures import ThreadPoolExecutor
+from facilities import (
+    facility_name, fetch_all, rank_candidates,
+)
+from booking_form import FormCache
+from change_detector import ChangeDetector
+from scheduler import AdaptiveScheduler
+from history import HistoryStore
+from retry import Retrier, CircuitOpen, not_processed
+from rate_limit import HostRateLimiter
+from feed import FeedPublisher, FeedSubscriber
+from cluster import ClusterNode
+from date_rules import load_rules
+from recording import Recorder
+from slot_policy import load_policy
+from session_cache import SessionCache
+from supervisor import WorkerState
+from browser_pool import BrowserPool, sweep_stale_profiles
+from lean_browser import load_profile, load_page
+from session_keeper import SessionKeeper
+from log_setup import setup_logging
+from settings import load_config, load_settings
+from metrics import (
+    PHASE_SECONDS, POLLS, RELOGINS, BOOKINGS, instrument_session, start_http_server, start_summary,
 )
 
 logger = logging.getLogger(__name__)
 
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-USERNAME = config['USVISA']['USERNAME']
-PASSWORD = config['USVISA']['PASSWORD']
-SCHEDULE_ID = config['USVISA']['SCHEDULE_ID']
-MY_SCHEDULE_DATE = config['USVISA']['MY_SCHEDULE_DATE']
-COUNTRY_CODE = config['USVISA']['COUNTRY_CODE']
-FACILITY_ID = config['USVISA']['FACILITY_ID']
+# config.ini 只解析一次，其他模块通过 settings.load_config() 共用
+config = load_config()
+settings = load_settings(config)
+
+USERNAME = settings.username
+PASSWORD = settings.password
+SCHEDULE_ID = settings.schedule_id
+MY_SCHEDULE_DATE = settings.my_schedule_date
+COUNTRY_CODE = settings.country_code
+FACILITY_ID = settings.facility_id
+# 多使馆查询：FACILITY_IDS = 95, 89, 94；FACILITY_WEIGHTS = 89:14, 94:30（偏好权重，单位天）
+FACILITY_IDS = settings.facility_ids
+FACILITY_WEIGHTS = settings.facility_weights
+# 可指向本地模拟服务器做测试
+BASE_URL = settings.base_url
+# 登录方式: http（纯 HTTP，失败时回退浏览器）或 selenium
+LOGIN_BACKEND = settings.login_backend
 
 SENDGRID_API_KEY = config['SENDGRID']['SENDGRID_API_KEY']
 PUSH_TOKEN = config['PUSHOVER']['PUSH_TOKEN']
 PUSH_USER = config['PUSHOVER']['PUSH_USER']
 
-LOCAL_USE = config['CHROMEDRIVER'].getboolean('LOCAL_USE')
-HUB_ADDRESS = config['CHROMEDRIVER']['HUB_ADDRESS']
+LOCAL_USE = settings.local_use
+HUB_ADDRESS = settings.hub_address
+# 无浏览器轮询：登录后把 cookie/UA 交给 requests.Session，并关闭 Chrome
+BROWSERLESS = settings.browserless
 
 REGEX_CONTINUE = "//a[contains(text(),'Continue')]"
 
+# 预约表单预取：后台定期刷新 authenticity_token 等隐藏字段，发现日期后直接提交
+FORM_REFRESH_SECONDS = config.getint('BOOKING', 'FORM_REFRESH_SECONDS', fallback=120)
+FORM_MAX_AGE_SECONDS = config.getint('BOOKING', 'FORM_MAX_AGE_SECONDS', fallback=300)
+# 发现日期后并发查询前 TOP_DATES 个日期的 times，按策略排序，提交失败时立即尝试下一个
+BOOKING_TOP_DATES = config.getint('BOOKING', 'TOP_DATES', fallback=3)
+BOOKING_MAX_ATTEMPTS = config.getint('BOOKING', 'MAX_ATTEMPTS', fallback=4)
+slot_policy = load_policy(config)
+
 # 活跃刷 slot 的时间段，按小时（24小时制）
 # 示例为：(起始小时, 结束小时)，表示每天在这些时间段内刷 slot
 
@@ -68,35 +93,145 @@ ACTIVE_TIME_SLOTS = [
 ]
 
 
-def MY_CONDITION(month, day): return True
+# 自定义日期条件，例如只要 11、12 月：
+# def MY_CONDITION(month, day): return month in (11, 12)
+# 为 None 时不限制，规则只按 ISO 字符串比较，不需要逐个解析日期
+MY_CONDITION = None
+
+# 可接受日期规则（[RULES]），每轮对全部候选日期过滤
+date_rules = load_rules(config, MY_SCHEDULE_DATE, condition=MY_CONDITION)
+
+# 自适应轮询节奏：按历史放号时段分配请求预算，关闭时使用固定的 2~6 秒随机间隔
+ADAPTIVE_SCHEDULE = config.getboolean('SCHEDULER', 'ENABLED', fallback=False)
+scheduler = AdaptiveScheduler(
+    config.get('SCHEDULER', 'STATE_FILE', fallback='scheduler_state.json'),
+    budget_per_hour=config.getint('SCHEDULER', 'BUDGET_PER_HOUR', fallback=900),
+    min_interval=config.getfloat('SCHEDULER', 'MIN_INTERVAL', fallback=2.0),
+    max_interval=config.getfloat('SCHEDULER', 'MAX_INTERVAL', fallback=60.0),
+    requests_per_poll=len(FACILITY_IDS),
+) if ADAPTIVE_SCHEDULE else None
+
+# 单轮询多订阅：publish 正常轮询并把变化推送给本机订阅者；subscribe 不轮询 days，只等推送并自行预约
+FEED_ROLE = config.get('FEED', 'ROLE', fallback='off').lower()
+FEED_SOCKET = config.get('FEED', 'SOCKET', fallback='/tmp/visa_feed.sock')
+feed_publisher = None
+feed_subscriber = None
+
+# 多节点分片轮询：各节点通过共享的 SQLite 协调库分摊使馆的轮询并互相发布变化
+CLUSTER_ENABLED = config.getboolean('CLUSTER', 'ENABLED', fallback=False)
+cluster = None
+# 本节点分到的使馆占全部使馆的比例，两轮之间的间隔按它缩短
+cluster_share = 1.0
+
+# 由 supervisor 启动时写心跳和检查点，单独运行时为 None
+worker_state = WorkerState.from_env()
 
 def get_cooldown():
+    if feed_subscriber is not None:
+        # 订阅模式由推送驱动，等待发生在 feed_subscriber.wait() 里
+        return 0
+    if scheduler is not None:
+        return scheduler.next_interval()
     return random.randint(2, 6)
 
 STEP_TIME = 0.3
 RETRY_TIME = 2
 EXCEPTION_TIME = 5
 
-DATE_URL = f"https://ais.usvisa-info.com/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}/appointment/days/{FACILITY_ID}.json?appointments[expedite]=false"
-TIME_URL = f"https://ais.usvisa-info.com/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}/appointment/times/{FACILITY_ID}.json?date=%s&appointments[expedite]=false"
-APPOINTMENT_URL = f"https://ais.usvisa-info.com/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}/appointment"
+DATE_URL_TEMPLATE = f"{BASE_URL}/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}/appointment/days/%s.json?appointments[expedite]=false"
+TIME_URL_TEMPLATE = f"{BASE_URL}/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}/appointment/times/%s.json?date=%s&appointments[expedite]=false"
+DATE_URL = DATE_URL_TEMPLATE % FACILITY_ID
+APPOINTMENT_URL = f"{BASE_URL}/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}/appointment"
+SIGN_IN_URL = f"{BASE_URL}/{COUNTRY_CODE}/niv/users/sign_in"
+SCHEDULE_URL = f"{BASE_URL}/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}"
 EXIT = False
-last_seen = None
+# 记录每个使馆上一次看到的可预约日期，只在有变化时才评估和打日志
+change_detector = ChangeDetector()
+# 预约失败后日期可能还在：下一轮即使没有变化也重新评估（订阅、集群模式下的日期不经过 change_detector）
+reevaluate_pending = False
+# 每次轮询结果写入本地 SQLite 历史库（后台线程写入）
+HISTORY_ENABLED = config.getboolean('HISTORY', 'ENABLED', fallback=False)
+history = None
+
+# 通知在后台线程发送，调用方只入队
+NOTIFY_QUEUE_SIZE = config.getint('NOTIFY', 'QUEUE_SIZE', fallback=100)
+NOTIFY_COALESCE_SECONDS = config.getfloat('NOTIFY', 'COALESCE_SECONDS', fallback=2.0)
+notifier = None
+
+# 录制 days / times / 预约表单 / 预约提交 的真实响应，供 recording.py 离线回放
+RECORD_ENABLED = config.getboolean('RECORD', 'ENABLED', fallback=False)
+recorder = None
+
+# 加密的会话缓存：重启时先验证并复用上次的会话
+SESSION_CACHE_ENABLED = config.getboolean('SESSION', 'CACHE', fallback=False)
+session_cache = None
+
+# 历史库、录制、会话缓存、通知都在第一次用到时才创建，import visa 不启动线程也不写文件
+_lazy_lock = threading.Lock()
+
+def get_history():
+    global history
+    if history is None and HISTORY_ENABLED:
+        with _lazy_lock:
+            if history is None:
+                history = HistoryStore(
+                    config.get('HISTORY', 'DB_PATH', fallback='history.db'),
+                    keep_days=config.getint('HISTORY', 'KEEP_DAYS', fallback=30),
+                    span_keep_days=config.getint('HISTORY', 'SPAN_KEEP_DAYS', fallback=365),
+                )
+    return history
+
+def get_recorder():
+    global recorder
+    if recorder is None and RECORD_ENABLED:
+        with _lazy_lock:
+            if recorder is None:
+                recorder = Recorder(config.get('RECORD', 'PATH', fallback='recording.jsonl.gz'))
+    return recorder
+
+def get_session_cache():
+    global session_cache
+    if session_cache is None and SESSION_CACHE_ENABLED:
+        with _lazy_lock:
+            if session_cache is None:
+                session_cache = SessionCache(
+                    config.get('SESSION', 'CACHE_DIR', fallback='session_cache'),
+                    max_age=config.getfloat('SESSION', 'CACHE_MAX_AGE', fallback=3600),
+                )
+    return session_cache
+
+def close_services():
+    # 退出前把历史库、录制和通知队列里剩下的内容写完/发出
+    if history is not None:
+        history.close()
+    if recorder is not None:
+        recorder.close()
+    if notifier is not None:
+        notifier.close()
+
+def get_notifier():
+    global notifier
+    if notifier is None:
+        notifier = Notifier(build_channels(config), maxsize=NOTIFY_QUEUE_SIZE,
+                            coalesce_seconds=NOTIFY_COALESCE_SECONDS)
+    return notifier
 
 def send_notification(msg):
     logger.info(f"发送通知: {msg}")
-    subject = "Visa Appointment Notification"
-    send_email(subject, msg)
+    get_notifier().notify(msg)
 
-import tempfile
-def get_driver():
+# 精简浏览器（[CHROMEDRIVER] LEAN）：拦截图片、字体和第三方脚本，限制内存
+lean_profile = load_profile(config)
+
+def get_driver(tmp_profile_dir=None):
     from selenium import webdriver
     from selenium.webdriver.chrome.service import Service
     from selenium.webdriver.chrome.options import Options
 
     chrome_options = Options()
     chrome_options.binary_location = "/opt/chrome/chrome"
-    tmp_profile_dir = tempfile.mkdtemp(prefix="chrome-profile-")
+    # 由 BrowserPool 传入并负责清理；单独调用时自己创建
+    tmp_profile_dir = tmp_profile_dir or tempfile.mkdtemp(prefix="chrome-profile-")
     chrome_options.add_argument(f"--user-data-dir={tmp_profile_dir}")
     chrome_options.add_argument("--headless=new")  # 更稳定
     chrome_options.add_argument("--no-sandbox")
@@ -108,160 +243,421 @@ def get_driver():
     chrome_options.add_argument("--disable-sync")
     chrome_options.add_argument("--metrics-recording-only")
     chrome_options.add_argument("--mute-audio")
+    if lean_profile is not None:
+        lean_profile.configure(chrome_options)
 
     service = Service("/usr/local/bin/chromedriver")
 
-    return webdriver.Chrome(service=service, options=chrome_options)
+    drv = webdriver.Chrome(service=service, options=chrome_options)
+    if lean_profile is not None:
+        lean_profile.apply(drv)
+    return drv
 
 driver = None
+session = None
+
+def standby_login(drv):
+    load_page(drv, SIGN_IN_URL)
+    time.sleep(STEP_TIME)
+    do_login_action(drv)
+
+# 所有 Chrome 都经由浏览器池创建和关闭，避免僵尸进程和遗留的 profile 目录
+browser_pool = BrowserPool(
+    get_driver,
+    max_browsers=config.getint('CHROMEDRIVER', 'MAX_BROWSERS', fallback=2),
+    max_idle=config.getint('CHROMEDRIVER', 'MAX_IDLE', fallback=0),
+    standby_login=standby_login if config.getboolean('CHROMEDRIVER', 'STANDBY', fallback=False) else None,
+    standby_max_age=config.getint('CHROMEDRIVER', 'STANDBY_MAX_AGE', fallback=1200),
+)
+
+def close_browsers():
+    global driver
+    if driver is not None:
+        browser_pool.discard(driver)
+        driver = None
+    browser_pool.shutdown()
+
+atexit.register(close_browsers)
+
+def build_login(proactive=False):
+    # 完成一次登录并返回 (driver, session)，不修改当前的全局会话
+    if LOGIN_BACKEND == 'http':
+        try:
+            return None, http_login(BASE_URL, COUNTRY_CODE, USERNAME, PASSWORD)
+        except Exception as e:
+            logger.warning(f"HTTP 登录失败，回退到浏览器登录: {e}")
+
+    new_driver = browser_pool.take_standby()
+    if new_driver is not None:
+        logger.info("使用已登录的备用浏览器")
+    else:
+        # 主动刷新时旧浏览器还在用，没有空闲名额就放弃这次刷新，不阻塞等待
+        new_driver = browser_pool.acquire(block=not proactive)
+        if new_driver is None:
+            raise RuntimeError("没有空闲的浏览器名额")
+        try:
+            load_page(new_driver, SIGN_IN_URL)
+            time.sleep(STEP_TIME)
+            do_login_action(new_driver)
+        except Exception:
+            browser_pool.discard(new_driver)
+            raise
+
+    new_session = export_driver_session(new_driver)
+    if BROWSERLESS:
+        logger.info("已导出登录会话，关闭浏览器，进入无浏览器轮询模式")
+        browser_pool.release(new_driver)
+        new_driver = None
+    return new_driver, new_session
+
+def swap_session(new_driver, new_session):
+    # 原子替换当前会话；旧浏览器在替换之后再关闭
+    global driver, session
+    instrument_session(new_session)
+    if get_recorder() is not None:
+        recorder.attach(new_session)
+    with session_lock:
+        old_driver = driver
+        driver, session = new_driver, new_session
+    if old_driver is not None and old_driver is not new_driver:
+        browser_pool.retire(old_driver)
+    form_cache.invalidate()
+    session_keeper.session_started(new_session)
+    if get_session_cache() is not None:
+        session_cache.save(USERNAME, new_session)
 
 def login():
     global driver
-    driver = get_driver()
+    # 会话已经失效，旧浏览器没有用处了，先关闭以腾出名额
+    with session_lock:
+        old_driver, driver = driver, None
+    if old_driver is not None:
+        browser_pool.discard(old_driver)
+    with PHASE_SECONDS.time(phase="login"):
+        swap_session(*build_login())
+
+def resume_session():
+    # 启动时复用缓存的会话：一次 days 请求验证通过就不再登录
+    cached = session_cache.load(USERNAME) if get_session_cache() is not None else None
+    if cached is None:
+        return False
+    try:
+        fetch_json(cached, DATE_URL_TEMPLATE % FACILITY_IDS[0], SCHEDULE_URL, timeout=10)
+    except Exception as e:
+        logger.info(f"缓存的会话已失效，重新登录: {e}")
+        session_cache.discard(USERNAME)
+        return False
+    swap_session(None, cached)
+    logger.info("复用缓存的会话，跳过登录")
+    return True
+
+def renew_session():
+    with PHASE_SECONDS.time(phase="login"):
+        swap_session(*build_login(proactive=True))
+    RELOGINS.inc(reason="keep_alive")
+
+session_lock = threading.Lock()
+
+# 后台会话保活：在估计的过期时间之前并行登录并替换
+session_keeper = SessionKeeper(
+    renew_session,
+    lifetime=config.getfloat('SESSION', 'LIFETIME', fallback=1800.0),
+    margin=config.getfloat('SESSION', 'REFRESH_MARGIN', fallback=0.8),
+)
+KEEP_ALIVE = config.getboolean('SESSION', 'KEEP_ALIVE', fallback=False)
 
-    driver.get(f"https://ais.usvisa-info.com/en-ca/niv/users/sign_in")
-    time.sleep(STEP_TIME)
-    do_login_action()
+# 后台线程直接使用当前 session，不去碰 driver（WebDriver 不是线程安全的）
+form_cache = FormCache(
+    lambda: fetch_appointment_form(session, APPOINTMENT_URL),
+    refresh_interval=FORM_REFRESH_SECONDS,
+    max_age=FORM_MAX_AGE_SECONDS,
+)
 
-def do_login_action():
+def get_session():
+    # 浏览器模式下每次从 Chrome 同步 cookie；无浏览器模式直接复用登录时导出的 session
+    # 在锁内取一对一致的 (driver, session)；被替换下来的浏览器延迟关闭，同步期间不会失效
+    with session_lock:
+        drv, http = driver, session
+    if drv is not None:
+        sync_cookies(http, drv)
+    return http
+
+def do_login_action(drv=None, username=None, password=None):
+    # Selenium 只在真正需要浏览器时才导入，纯 HTTP 模式下启动更快
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait as Wait
+    from selenium.webdriver.common.by import By
     logger = logging.getLogger(__name__)
+    drv = drv or driver
+    username = username or USERNAME
+    password = password or PASSWORD
     try:
         logger.info("等待邮箱输入框出现")
-        Wait(driver, 30).until(EC.presence_of_element_located((By.ID, 'user_email')))
-        user = driver.find_element(By.ID, 'user_email')
+        Wait(drv, 30).until(EC.presence_of_element_located((By.ID, 'user_email')))
+        user = drv.find_element(By.ID, 'user_email')
         user.clear()
-        user.send_keys(USERNAME)
+        user.send_keys(username)
         time.sleep(random.uniform(1, 3))
 
         logger.info("等待密码输入框出现")
-        Wait(driver, 30).until(EC.presence_of_element_located((By.ID, 'user_password')))
-        pw = driver.find_element(By.ID, 'user_password')
+        Wait(drv, 30).until(EC.presence_of_element_located((By.ID, 'user_password')))
+        pw = drv.find_element(By.ID, 'user_password')
         pw.clear()
-        pw.send_keys(PASSWORD)
+        pw.send_keys(password)
         time.sleep(random.uniform(1, 3))
 
         logger.info("等待隐私条款勾选框出现")
-        Wait(driver, 30).until(EC.element_to_be_clickable((By.CLASS_NAME, 'icheckbox')))
-        box = driver.find_element(By.CLASS_NAME, 'icheckbox')
+        Wait(drv, 30).until(EC.element_to_be_clickable((By.CLASS_NAME, 'icheckbox')))
+        box = drv.find_element(By.CLASS_NAME, 'icheckbox')
         box.click()
         time.sleep(random.uniform(1, 3))
 
         logger.info("等待登录按钮出现")
-        Wait(driver, 30).until(EC.element_to_be_clickable((By.NAME, 'commit')))
-        btn = driver.find_element(By.NAME, 'commit')
+        Wait(drv, 30).until(EC.element_to_be_clickable((By.NAME, 'commit')))
+        btn = drv.find_element(By.NAME, 'commit')
         btn.click()
         time.sleep(random.uniform(1, 3))
 
         logger.info("等待登录后页面元素出现（Continue按钮）")
-        Wait(driver, 60).until(EC.presence_of_element_located((By.XPATH, REGEX_CONTINUE)))
+        Wait(drv, 60).until(EC.presence_of_element_located((By.XPATH, REGEX_CONTINUE)))
 
         logger.info("登录成功")
 
     except Exception as e:
         logger.error(f"登录过程中出错: {e}", exc_info=True)
         screenshot_path = f"/tmp/login_error_{int(time.time())}.png"
-        driver.save_screenshot(screenshot_path)
+        drv.save_screenshot(screenshot_path)
         logger.info(f"登录失败时截图已保存: {screenshot_path}")
         raise
 
-def get_date():
-    cookie_dict = {c['name']: c['value'] for c in driver.get_cookies()}
-    cookie_string = "; ".join([f"{k}={v}" for k, v in cookie_dict.items()])
-
-    headers = {
-        "User-Agent": driver.execute_script("return navigator.userAgent;"),
-        "Referer": f"https://ais.usvisa-info.com/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}",
-        "X-Requested-With": "XMLHttpRequest",
-        "Cookie": cookie_string
-    }
-
-    try:
-        logger.info(f"请求可预约日期: {DATE_URL}")
-        response = requests.get(DATE_URL, headers=headers, timeout=30)
-
-        if response.status_code == 401 or "session expired" in response.text.lower():
-            logger.warning("Session expired or unauthorized (401)，重新登录中...")
-            # send_notification("Session expired or unauthorized, re-login...")
-            login()
-            time.sleep(STEP_TIME)
-            return get_date()
+def fetch_dates(facility_id, http=None):
+    # 单次请求 days 接口；内容与上次相同时直接复用上次解析结果
+    if http is None:
+        with PHASE_SECONDS.time(phase="cookie_sync"):
+            http = get_session()
+    date_url = DATE_URL_TEMPLATE % facility_id
+    logger.debug(f"请求可预约日期: {date_url}")
+    headers = ajax_headers(SCHEDULE_URL)
+    headers.update(change_detector.conditional_headers(facility_id))
+    with PHASE_SECONDS.time(phase="days_request"):
+        response = http.get(date_url, headers=headers, timeout=30)
+
+    if is_session_expired(response):
+        raise SessionExpired(f"session expired ({response.status_code}): {date_url}")
+
+    response.raise_for_status()
+    with PHASE_SECONDS.time(phase="json_parse"):
+        dates = change_detector.parse(facility_id, response)
+    if get_history() is not None:
+        history.record(facility_id, dates)
+    return dates
+
+def relogin():
+    session_keeper.session_expired()
+    RELOGINS.inc(reason="expired")
+    login()
+    time.sleep(STEP_TIME)
 
-        response.raise_for_status()
-        date_data = response.json()
-        return date_data
+# 同一台机器上的多个进程共享的限速器，合计请求速率不超过站点可接受的上限
+rate_limiter = HostRateLimiter(
+    config.get('RATE_LIMIT', 'STATE_FILE', fallback=None),
+    rate=config.getfloat('RATE_LIMIT', 'RATE', fallback=30.0),
+    min_rate=config.getfloat('RATE_LIMIT', 'MIN_RATE', fallback=6.0),
+    max_rate=config.getfloat('RATE_LIMIT', 'MAX_RATE', fallback=60.0),
+    burst=config.getfloat('RATE_LIMIT', 'BURST', fallback=5.0),
+    booking_reserve=config.getfloat('RATE_LIMIT', 'BOOKING_RESERVE', fallback=1.0),
+    penalty=config.getfloat('RATE_LIMIT', 'PENALTY', fallback=60.0),
+) if config.getboolean('RATE_LIMIT', 'ENABLED', fallback=False) else None
+
+# days / times / 预约提交 共用的重试与熔断
+retrier = Retrier(
+    max_attempts=config.getint('RETRY', 'MAX_ATTEMPTS', fallback=4),
+    base_delay=config.getfloat('RETRY', 'BASE_DELAY', fallback=0.5),
+    max_delay=config.getfloat('RETRY', 'MAX_DELAY', fallback=30.0),
+    failure_threshold=config.getint('RETRY', 'FAILURE_THRESHOLD', fallback=5),
+    reset_timeout=config.getfloat('RETRY', 'RESET_TIMEOUT', fallback=30.0),
+    on_session_expired=relogin,
+    limiter=rate_limiter,
+)
 
-    except requests.exceptions.RequestException as e:
-        logger.warning(f"请求异常: {e}")
-        time.sleep(STEP_TIME * 3)
-        return get_date()
+def get_date(facility_id=FACILITY_ID):
+    return retrier.call("days", fetch_dates, facility_id)
 
-def get_time(date):
-    cookie_dict = {c['name']: c['value'] for c in driver.get_cookies()}
-    cookie_string = "; ".join([f"{k}={v}" for k, v in cookie_dict.items()])
+facility_pool = ThreadPoolExecutor(max_workers=len(FACILITY_IDS)) if len(FACILITY_IDS) > 1 else None
 
-    headers = {
-        "User-Agent": driver.execute_script("return navigator.userAgent;"),
-        "Referer": f"https://ais.usvisa-info.com/{COUNTRY_CODE}/niv/schedule/{SCHEDULE_ID}",
-        "X-Requested-With": "XMLHttpRequest",
-        "Cookie": cookie_string
-    }
+def fetch_facilities(facility_ids):
+    # 返回 {facility_id: dates}；只有一个使馆时与原来的 get_date() 相同
+    if facility_pool is None or len(facility_ids) == 1:
+        return {facility_id: get_date(facility_id) for facility_id in facility_ids}
 
-    time_url = TIME_URL % date
+    logger.debug(f"并发查询 {len(facility_ids)} 个使馆: {[facility_name(fid) for fid in facility_ids]}")
     try:
-        logger.info(f"请求预约时间: {time_url}")
-        response = requests.get(time_url, headers=headers, timeout=30)
-        logger.info(f"预约时间响应状态码: {response.status_code}")
-        logger.debug(f"预约时间响应内容: {response.text[:500]}")
-        response.raise_for_status()
-        data = response.json()
-        time_str = data.get("available_times")[-1]
-        logger.info(f"获取时间成功: {date} {time_str}")
-        return time_str
-    except Exception as e:
-        logger.error(f"⚠️ 获取预约时间失败: {e}")
-        raise
-
-def reschedule(date):
-    global EXIT
-    logger.info(f"尝试重新预约: {date}")
-
-    trying_msg = f"TRY to reschedule visa appointment：{date}"
-    send_notification(trying_msg)
-
-    time_str = get_time(date)
-    driver.get(APPOINTMENT_URL)
-
-    data = {
-        "utf8": driver.find_element(by=By.NAME, value='utf8').get_attribute('value'),
-        "authenticity_token": driver.find_element(by=By.NAME, value='authenticity_token').get_attribute('value'),
-        "confirmed_limit_message": driver.find_element(by=By.NAME, value='confirmed_limit_message').get_attribute('value'),
-        "use_consulate_appointment_capacity": driver.find_element(by=By.NAME, value='use_consulate_appointment_capacity').get_attribute('value'),
-        "appointments[consulate_appointment][facility_id]": FACILITY_ID,
-        "appointments[consulate_appointment][date]": date,
-        "appointments[consulate_appointment][time]": time_str,
-    }
-
-    headers = {
-        "User-Agent": driver.execute_script("return navigator.userAgent;"),
-        "Referer": APPOINTMENT_URL,
-        "Cookie": "_yatri_session=" + driver.get_cookie("_yatri_session")["value"]
-    }
-
-    r = requests.post(APPOINTMENT_URL, headers=headers, data=data)
-    if "Successfully Scheduled" in r.text:
-        msg = f"预约修改成功: {date} {time_str}"
-        send_notification(msg)
-        EXIT = True
+        http = get_session()
+        return fetch_all(facility_pool, lambda fid: retrier.call("days", fetch_dates, fid, http, relogin=False),
+                         facility_ids)
+    except SessionExpired:
+        # 多个线程同时发现会话过期时只在这里登录一次
+        logger.warning("Session expired or unauthorized (401)，重新登录中...")
+        relogin()
+        http = get_session()
+        return fetch_all(facility_pool, lambda fid: retrier.call("days", fetch_dates, fid, http, relogin=False),
+                         facility_ids)
+
+def get_candidates():
+    # 返回按偏好排序的 [(date, facility_id), ...]
+    return rank_candidates(fetch_facilities(FACILITY_IDS), FACILITY_WEIGHTS)
+
+def cluster_candidates():
+    # 集群模式：只轮询分到的使馆，其余使馆用其他节点发布的结果，返回 (candidates, events)
+    global cluster_share
+    owned = cluster.sync(FACILITY_IDS)
+    cluster_share = max(len(owned), 1) / len(FACILITY_IDS)
+    results = fetch_facilities(owned)
+    events = change_detector.pop_events()
+    for event in events:
+        cluster.publish(event.key, [d.get('date') for d in results[event.key]])
+    events += [e for e in cluster.poll() if e.key in FACILITY_IDS]
+    merged = cluster.results(FACILITY_IDS)
+    merged.update(results)
+    return rank_candidates(merged, FACILITY_WEIGHTS), events
+
+def idle():
+    # 两轮之间的等待；集群模式下其他节点发布变化时提前结束
+    delay = get_cooldown()
+    if cluster is not None:
+        # 每轮只查分到的使馆，间隔按比例缩短：每个节点的请求速率与单机相同，每个使馆的检测频率随节点数线性增长
+        delay *= cluster_share
+    pause(delay, wake_on_change=True)
+
+def pause(delay, wake_on_change=False):
+    # 集群模式下等待期间持续续约
+    if cluster is not None:
+        cluster.wait(delay, wake_on_change)
     else:
-        msg = f"预约修改失败: {date} {time_str}"
-        send_notification(msg)
+        time.sleep(delay)
+
+def wait_candidates():
+    # 订阅模式：阻塞等待发布者推送变化，返回 (candidates, events)
+    events = feed_subscriber.wait(timeout=RETRY_TIME)
+    return rank_candidates(feed_subscriber.results(), FACILITY_WEIGHTS), events
+
+def publish_events(events, candidates):
+    for event in events:
+        feed_publisher.publish(event, [d for d, fid in candidates if fid == event.key])
+
+def fetch_time(date, facility_id, http=None):
+    # 并发查询时由调用方传入同一个 session，避免多个线程同时从 Chrome 同步 cookie
+    http = http or get_session()
+    time_url = TIME_URL_TEMPLATE % (facility_id, date)
+    logger.info(f"请求预约时间: {time_url}")
+    with PHASE_SECONDS.time(phase="times_request"):
+        response = http.get(time_url, headers=ajax_headers(SCHEDULE_URL), timeout=30)
+    logger.info(f"预约时间响应状态码: {response.status_code}")
+    logger.debug(f"预约时间响应内容: {response.text[:500]}")
+    if is_session_expired(response):
+        raise SessionExpired(f"session expired ({response.status_code}): {time_url}")
+    response.raise_for_status()
+    return response.json()
+
+slot_pool = ThreadPoolExecutor(max_workers=BOOKING_TOP_DATES)
+
+def get_slots(candidates):
+    # 并发查询前 BOOKING_TOP_DATES 个候选日期的 times，返回按策略排好序的 [Slot, ...]
+    candidates = candidates[:BOOKING_TOP_DATES]
+    http = get_session()
+    futures = {c: slot_pool.submit(retrier.call, "times", fetch_time, c[0], c[1], http, relogin=False)
+               for c in candidates}
+    times = {}
+    expired = None
+    for (date, facility_id), future in futures.items():
+        try:
+            times[(date, facility_id)] = future.result().get("available_times") or []
+        except SessionExpired as e:
+            expired = e
+        except Exception as e:
+            logger.error(f"⚠️ 获取预约时间失败: {date} ({facility_name(facility_id)}): {e}")
+    if expired is not None and not times:
+        raise expired
+    return slot_policy.rank(candidates, times)
 
-def is_earlier(date_str):
-    my_date = datetime.strptime(MY_SCHEDULE_DATE, "%Y-%m-%d")
-    new_date = datetime.strptime(date_str, "%Y-%m-%d")
-    result = my_date > new_date
-    logger.info(f"是否找到更早时间: {my_date} > {new_date} = {result}")
-    return result
+def reschedule(candidates, detected_at=None):
+    # candidates: 满足规则的 [(date, facility_id), ...]，按偏好排序
+    global EXIT
+    detected_at = detected_at or time.monotonic()
+
+    # 关键路径：并发 times 查询 + 缓存表单 + POST，通知放到提交之后
+    slots = get_slots(candidates)
+    times_done = time.monotonic()
+    if not slots:
+        logger.warning("候选日期都没有可用的预约时间")
+        request_reevaluation()
+        return
+    logger.info(f"可用时间 {len(slots)} 个，按顺序尝试: "
+                f"{[f'{s.date} {s.time}' for s in slots[:BOOKING_MAX_ATTEMPTS]]}")
+
+    failed = []
+    for attempt, slot in enumerate(slots[:BOOKING_MAX_ATTEMPTS]):
+        logger.info(f"尝试重新预约: {slot.date} {slot.time} ({facility_name(slot.facility_id)})")
+        try:
+            # 表单先取好（可重试）；提交只在确定没有被处理时重试，重新登录后才会在提交里重新取表单
+            retrier.call("form", form_cache.get)
+        except Exception as e:
+            # 还没有提交，直接尝试下一个
+            logger.warning(f"获取预约表单失败: {slot.date} {slot.time}: {e}")
+            failed.append(f"{slot.date} {slot.time}")
+            continue
+        # 每次提交后 token 失效，下一次尝试会重新取表单
+        post_started = time.monotonic()
+        error = None
+        try:
+            with PHASE_SECONDS.time(phase="booking_post"):
+                ok = retrier.call("book", lambda: book_appointment(
+                    get_session(), APPOINTMENT_URL, form_cache.get(), slot.facility_id, slot.date, slot.time))
+        except Exception as e:
+            ok, error = False, e
+        posted = time.monotonic()
+        form_cache.invalidate()
+        PHASE_SECONDS.observe(posted - detected_at, phase="detect_to_post")
+        logger.info(
+            f"预约提交耗时（第 {attempt + 1} 次）: 检测->POST完成 {(posted - detected_at) * 1000:.0f} ms"
+            f"（times {(times_done - detected_at) * 1000:.0f} ms, POST {(posted - post_started) * 1000:.0f} ms）"
+        )
+        if error is not None and not not_processed(error):
+            # 读超时、连接中断、5xx：站点可能已经处理了这次提交，再提交下一个可能把预约换成更差的时间
+            BOOKINGS.inc(result="unknown")
+            hold_uncertain(slot, error)
+            return
+        BOOKINGS.inc(result="success" if ok else "failure")
+        if ok:
+            send_notification(f"预约修改成功: {slot.date} {slot.time}")
+            EXIT = True
+            if worker_state is not None:
+                worker_state.save(booked=True, slot={"date": slot.date, "time": slot.time,
+                                                     "facility_id": slot.facility_id})
+            return
+        if error is not None:
+            # 确定没有被处理（429、连接没建立、熔断、401）：直接尝试下一个
+            logger.warning(f"预约提交出错: {slot.date} {slot.time}: {error}，立即尝试下一个")
+        else:
+            logger.warning(f"预约提交失败: {slot.date} {slot.time}，立即尝试下一个")
+        failed.append(f"{slot.date} {slot.time}")
+
+    send_notification(f"预约修改失败: {', '.join(failed)}")
+    request_reevaluation()
+
+def request_reevaluation():
+    global reevaluate_pending
+    reevaluate_pending = True
+
+def hold_uncertain(slot, error):
+    # 提交结果不确定时按已经成功处理：之后只预约比它更早的日期，不会用更差的时间覆盖可能已经成功的预约
+    logger.error(f"预约提交结果不确定: {slot.date} {slot.time}: {error}")
+    date_rules.before = min(date_rules.before, slot.date)
+    send_notification(f"预约提交结果不确定: {slot.date} {slot.time}（{error}），请登录确认当前预约；"
+                      f"之后只尝试早于 {slot.date} 的日期")
+    if worker_state is not None:
+        worker_state.save(uncertain={"date": slot.date, "time": slot.time, "facility_id": slot.facility_id})
+    request_reevaluation()
 
 def within_active_time():
     now_hour = datetime.now().hour
@@ -274,63 +670,177 @@ def within_active_time():
                 return True
     return False
 
-if __name__ == "__main__":
+def preview(candidates):
+    # dry-run：查询并排序时间段，只记录将会提交的内容，不 POST
+    slots = get_slots(candidates)
+    if not slots:
+        logger.info("[dry-run] 候选日期都没有可用的预约时间")
+        return
+    for slot in slots[:BOOKING_MAX_ATTEMPTS]:
+        logger.info(f"[dry-run] 将会尝试预约: {slot.date} {slot.time} ({facility_name(slot.facility_id)})")
+
+def beat():
+    if worker_state is not None:
+        worker_state.beat()
+
+def restore_checkpoint():
+    # 从上一个 worker 的检查点恢复；已预约成功时返回 True
+    checkpoint = worker_state.load()
+    if checkpoint.get('booked'):
+        logger.info(f"检查点显示已预约成功: {checkpoint.get('slot')}，直接退出")
+        return True
+    uncertain = checkpoint.get('uncertain')
+    if uncertain:
+        # 上一个 worker 的提交结果不确定，继续按已预约处理
+        date_rules.before = min(date_rules.before, uncertain['date'])
+        logger.warning(f"检查点中有结果不确定的预约: {uncertain}，只尝试早于 {uncertain['date']} 的日期")
+    last_seen = checkpoint.get('last_seen') or {}
+    for facility_id, dates in last_seen.items():
+        change_detector.seed(facility_id, dates)
+    if last_seen:
+        logger.info(f"从检查点恢复上次看到的日期（此前共 {checkpoint.get('polls', 0)} 次轮询）")
+    return False
+
+def save_checkpoint(candidates):
+    last_seen = {facility_id: [] for facility_id in FACILITY_IDS}
+    for date, facility_id in candidates:
+        last_seen.setdefault(facility_id, []).append(date)
+    worker_state.save(last_seen=last_seen, last_poll_at=time.time(),
+                      polls=worker_state.load().get('polls', 0) + 1)
+
+def main(dry_run=False):
+    global feed_publisher, feed_subscriber, cluster, reevaluate_pending
+    setup_logging(config)
+    if worker_state is not None and restore_checkpoint():
+        return 0
     logger.info("启动，等待进入刷号时间段...")
 
     # 登录前先等到活跃时间段
     while not within_active_time():
         logger.info("⏳ 当前时间不在刷号时段内，等待下次...")
+        beat()
         time.sleep(RETRY_TIME)
 
     logger.info("当前时间在刷号时段内，启动模拟登录...")
-    login()
+    logger.info(f"可接受日期规则: {date_rules.describe()}")
+    if config.getboolean('METRICS', 'ENABLED', fallback=False):
+        start_http_server(config.get('METRICS', 'HOST', fallback='127.0.0.1'),
+                          config.getint('METRICS', 'PORT', fallback=9108))
+        start_summary(config.getint('METRICS', 'SUMMARY_INTERVAL', fallback=300))
+
+    if FEED_ROLE == 'publish':
+        feed_publisher = FeedPublisher(FEED_SOCKET)
+    elif FEED_ROLE == 'subscribe':
+        feed_subscriber = FeedSubscriber(FEED_SOCKET, FACILITY_IDS)
+    if CLUSTER_ENABLED:
+        cluster = ClusterNode(config.get('CLUSTER', 'PATH', fallback='cluster.db'),
+                              node_id=config.get('CLUSTER', 'NODE_ID', fallback='') or None,
+                              lease_seconds=config.getfloat('CLUSTER', 'LEASE_SECONDS', fallback=30))
+
+    sweep_stale_profiles()
+    if not resume_session():
+        login()
+    browser_pool.prepare_standby()
+    form_cache.start()
+    if KEEP_ALIVE:
+        session_keeper.start()
     retry_count = 0
     while True:
         if retry_count > 6:
             break
+        beat()
         try:
             if not within_active_time():
                 logger.info("⏳ 当前时间不在刷号时段内，等待下次...")
-                time.sleep(RETRY_TIME)
+                pause(RETRY_TIME)
                 continue
 
-            logger.info("--------开始检查--------")
-            logger.info(f"当前时间：{datetime.today()}")
-            logger.info(f"重试次数: {retry_count}")
-
-            dates = get_date()[:5]
-            logger.info(f"获取可用日期成功: {dates}")
+            logger.debug("--------开始检查--------")
+            logger.debug(f"当前时间：{datetime.today()}")
+            logger.debug(f"重试次数: {retry_count}")
 
-            if dates:
-                earliest = dates[0].get('date')
-                logger.info(f"当前查到的最早预约时间：{earliest}")
-
-                if is_earlier(earliest):
-                    logger.info(f"找到比预期更早的预约时间: {earliest}")
-                    reschedule(earliest)
-                    time.sleep(get_cooldown())
+            if feed_subscriber is not None:
+                candidates, events = wait_candidates()
+                detected_at = time.monotonic()
+            else:
+                if cluster is not None:
+                    candidates, events = cluster_candidates()
+                else:
+                    candidates = get_candidates()
+                    events = change_detector.pop_events()
+                detected_at = time.monotonic()
+                POLLS.inc()
+                if feed_publisher is not None:
+                    publish_events(events, candidates)
+            if worker_state is not None:
+                save_checkpoint(candidates)
+            if scheduler is not None and feed_subscriber is None:
+                scheduler.record_poll()
+                if any(not e.first and any(d < MY_SCHEDULE_DATE for d in e.added) for e in events):
+                    scheduler.record_release()
+            reevaluate, reevaluate_pending = reevaluate_pending, False
+            if not events and not reevaluate:
+                # 与上次完全相同：跳过评估和日志
+                logger.debug("可预约日期无变化")
+                idle()
+                continue
+            if reevaluate and not events:
+                logger.info("上次预约没有成功，重新评估当前的可预约日期")
+            for event in events:
+                logger.info(
+                    f"可预约日期变化 [{facility_name(event.key)}]: "
+                    f"新增 {event.added[:5]}{'...' if len(event.added) > 5 else ''} "
+                    f"移除 {event.removed[:5]}{'...' if len(event.removed) > 5 else ''}"
+                )
+            logger.info(f"获取可用日期成功: {candidates[:5]}")
+
+            acceptable = date_rules.filter(candidates)
+            if acceptable:
+                earliest, facility_id = acceptable[0]
+                logger.info(f"符合条件的候选 {len(acceptable)} 个，最优: {earliest} ({facility_name(facility_id)})")
+                if dry_run:
+                    preview(acceptable)
                 else:
-                    logger.info("暂无更早的预约时间，等待重试")
-                    time.sleep(get_cooldown())
+                    reschedule(acceptable, detected_at)
+                idle()
+            elif candidates:
+                logger.info(f"暂无符合条件的更早预约时间，当前最早: {candidates[0][0]}，等待重试")
+                idle()
             else:
                 logger.warning("暂无可预约日期，等待重试")
-                time.sleep(get_cooldown())
+                idle()
 
             if EXIT:
                 logger.info("已成功预约，退出脚本")
                 break
 
+        except CircuitOpen as e:
+            # 站点故障期间等到熔断器允许探测，不计入崩溃次数
+            logger.warning(f"{e}")
+            pause(max(e.retry_in, STEP_TIME))
+
         except Exception as e:
             logger.error(f"脚本异常: {e}")
+            change_detector.reset()
             if "session" in str(e).lower():
                 logger.warning("Session invalid，重新登录中...")
                 # send_notification("Session invalid, re-login...")
-                login()
-                time.sleep(STEP_TIME)
+                relogin()
                 retry_count = 0
                 continue
             retry_count += 1
-            time.sleep(EXCEPTION_TIME)
+            pause(EXCEPTION_TIME)
 
-    if not EXIT:
+    beat()
+    if not EXIT and worker_state is None:
+        # 由 supervisor 运行时会被重启，不发崩溃通知
         send_notification("HELP! Crashed.")
+    if feed_publisher is not None:
+        feed_publisher.close()
+    if cluster is not None:
+        cluster.close()
+    close_services()
+    return 0 if EXIT else 1
+
+if __name__ == "__main__":
+    sys.exit(main())